@@ -0,0 +1,128 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+
+class ColaLlena(RuntimeError):
+    def __init__(self, reintentar_en):
+        super().__init__(f"Demasiadas llamadas a Gemini en cola; reintentar en {reintentar_en:.0f}s")
+        self.reintentar_en = reintentar_en
+
+
+# --- Token bucket: `tasa` llamadas/s sostenidas con ráfagas de hasta `capacidad` ---
+class CuboTokens:
+    def __init__(self, tasa, capacidad):
+        self.tasa = tasa
+        self.capacidad = max(1, capacidad)
+        self._tokens = float(self.capacidad)
+        self._t = time.monotonic()
+
+    def espera(self):
+        # Segundos hasta que haya un token (0 si ya lo hay)
+        ahora = time.monotonic()
+        self._tokens = min(self.capacidad, self._tokens + (ahora - self._t) * self.tasa)
+        self._t = ahora
+        return 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.tasa
+
+    def consumir(self):
+        self._tokens -= 1
+
+
+# --- Control de admisión: cola acotada + llamadas en vuelo limitadas + token bucket ---
+class Admision:
+    def __init__(self, tasa=0, rafaga=1, max_en_vuelo=16, max_cola=64):
+        self._cubo = CuboTokens(tasa, rafaga) if tasa > 0 else None
+        self._sem = asyncio.Semaphore(max_en_vuelo)
+        self.max_en_vuelo = max_en_vuelo
+        self.max_cola = max_cola
+        self.en_cola = 0
+        self.en_vuelo = 0
+        self.rechazadas = 0
+
+    def saturada(self, n=1):
+        # ¿Excedería la cola encolar n llamadas más?
+        return self.en_cola + n > self.max_cola
+
+    def reintentar_en(self):
+        # Tiempo aproximado para vaciar la cola al ritmo del token bucket
+        if self._cubo is None:
+            return 1.0
+        return max(1.0, (self.en_cola + 1) / self._cubo.tasa)
+
+    def rechazar_si_saturada(self, n=1):
+        if self.saturada(n):
+            self.rechazadas += 1
+            raise ColaLlena(self.reintentar_en())
+
+    @asynccontextmanager
+    async def turno(self):
+        self.rechazar_si_saturada()
+        self.en_cola += 1
+        adquirido = False
+        try:
+            await self._sem.acquire()
+            adquirido = True
+            if self._cubo is not None:
+                # Comprobar y consumir sin await de por medio: atómico dentro del event loop
+                while (espera := self._cubo.espera()) > 0:
+                    await asyncio.sleep(espera)
+                self._cubo.consumir()
+        except BaseException:
+            if adquirido:
+                self._sem.release()
+            raise
+        finally:
+            self.en_cola -= 1
+        self.en_vuelo += 1
+        try:
+            yield
+        finally:
+            self.en_vuelo -= 1
+            self._sem.release()
+
+    def estadisticas(self):
+        return {
+            'en_cola': self.en_cola,
+            'en_vuelo': self.en_vuelo,
+            'max_cola': self.max_cola,
+            'max_en_vuelo': self.max_en_vuelo,
+            'rechazadas': self.rechazadas,
+        }
+
+
+# --- Single-flight: trabajo idéntico en curso se ejecuta una sola vez y se comparte ---
+class UnVuelo:
+    def __init__(self):
+        self._en_curso = {}          # clave -> [tarea, nº de interesados, límite de quien la lanzó]
+        self.fusionadas = 0
+
+    @staticmethod
+    def _cubre(limite_curso, limite):
+        # ¿Termina la llamada en curso (acotada a su límite) no antes que el nuestro?
+        return limite_curso is None or (limite is not None and limite_curso >= limite)
+
+    async def ejecutar(self, clave, crear, limite=None):
+        # limite: fin del presupuesto de quien llama (app/presupuesto.py). Sólo se comparte una llamada
+        # cuyo límite cubre el propio; si no, se lanza otra y pasa a ser la que comparten los siguientes
+        entrada = self._en_curso.get(clave)
+        if entrada is None or not self._cubre(entrada[2], limite):
+            tarea = asyncio.ensure_future(crear())
+            self._en_curso[clave] = entrada = [tarea, 0, limite]
+            tarea.add_done_callback(lambda _: self._soltar(clave, tarea))
+        else:
+            self.fusionadas += 1
+        tarea = entrada[0]
+        entrada[1] += 1
+        try:
+            return await asyncio.shield(tarea)
+        finally:
+            entrada[1] -= 1
+            # Si ya nadie espera el resultado (todas canceladas) se cancela la llamada compartida
+            if entrada[1] == 0 and not tarea.done():
+                self._soltar(clave, tarea)
+                tarea.cancel()
+
+    def _soltar(self, clave, tarea):
+        entrada = self._en_curso.get(clave)
+        if entrada is not None and entrada[0] is tarea:
+            del self._en_curso[clave]
@@ -0,0 +1,102 @@
+import hashlib
+import os
+import sys
+from dataclasses import dataclass
+
+import numpy as np
+
+from app.indice import IndiceNombres, TextosEmpaquetados
+
+VERSION_CACHE = 3
+
+
+# --- Almacén compacto de ingredientes: matriz float32 + nombres + índices ---
+@dataclass(frozen=True)
+class AlmacenIngredientes:
+    nombres: list | TextosEmpaquetados   # nombres originales (desde la cache: blob UTF-8 + offsets)
+    columnas: tuple              # numeric_cols, en el orden de la matriz
+    matriz: np.ndarray           # (n, len(columnas)) float32, valores por 100 g
+    indice: IndiceNombres
+    huella: str                  # sha256 del CSV de origen
+
+    def __len__(self):
+        return len(self.nombres)
+
+    def arrays(self):
+        nombres = self.nombres
+        if not isinstance(nombres, TextosEmpaquetados):
+            nombres = TextosEmpaquetados.desde_lista(nombres)
+        return {
+            'version': np.array(VERSION_CACHE),
+            'huella': np.array(self.huella),
+            'nombres': nombres.blob,
+            'nombres_off': nombres.offsets,
+            'columnas': np.array(self.columnas, dtype=str),
+            'matriz': self.matriz,
+            **self.indice.exportar(),
+        }
+
+    @classmethod
+    def desde_arrays(cls, arrays):
+        # Nombres, tablas hash y trigramas se usan tal cual: con memoria compartida son vistas
+        # del mmap y ningún worker construye listas ni diccionarios por nombre
+        nombres = TextosEmpaquetados(arrays['nombres'], arrays['nombres_off'])
+        return cls(
+            nombres=nombres,
+            columnas=tuple(arrays['columnas'].tolist()),
+            matriz=np.ascontiguousarray(arrays['matriz'], dtype=np.float32),
+            indice=IndiceNombres.desde_arrays(nombres, arrays),
+            huella=str(arrays['huella']),
+        )
+
+
+def huella_archivo(ruta):
+    h = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(1 << 20), b''):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def ruta_cache(cache_dir, huella):
+    return os.path.join(cache_dir, f"ingredientes-{huella[:16]}-v{VERSION_CACHE}.npz")
+
+
+def _desde_csv(ruta, huella):
+    from app.procesamiento import cargar_ingredientes
+
+    df, numeric_cols, indice = cargar_ingredientes(ruta)
+    return AlmacenIngredientes(
+        nombres=[sys.intern(n) for n in indice.nombres],
+        columnas=tuple(numeric_cols),
+        matriz=np.ascontiguousarray(df[numeric_cols].to_numpy(dtype=np.float32)),
+        indice=indice,
+        huella=huella,
+    )
+
+
+def cargar_almacen(ruta, cache_dir=None):
+    if not ruta or not os.path.exists(ruta):
+        raise FileNotFoundError(f"No se encontró el archivo de ingredientes: {ruta}")
+    huella = huella_archivo(ruta)
+    cache = ruta_cache(cache_dir, huella) if cache_dir else None
+
+    # El CSV sólo se parsea si no hay cache para esta huella y versión
+    if cache and os.path.exists(cache):
+        try:
+            with np.load(cache, allow_pickle=False) as arrays:
+                if int(arrays['version']) == VERSION_CACHE and str(arrays['huella']) == huella:
+                    return AlmacenIngredientes.desde_arrays(arrays)
+        except (OSError, KeyError, ValueError) as e:
+            print(f"[WARN] Cache de ingredientes inválida ({cache}): {e}")
+
+    almacen = _desde_csv(ruta, huella)
+    if cache:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp = f"{cache}.{os.getpid()}.tmp.npz"
+            np.savez(tmp, **almacen.arrays())
+            os.replace(tmp, cache)
+        except OSError as e:
+            print(f"[WARN] No se pudo escribir la cache de ingredientes: {e}")
+    return almacen
@@ -0,0 +1,91 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def clave_respuesta(nombres, version):
+    # Direccionada por contenido: el mismo conjunto de prototipos (sin importar el orden) y versión de prompt
+    canonico = json.dumps([version, sorted(set(nombres))], ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(canonico.encode('utf-8')).hexdigest()
+
+
+# --- Cache de respuestas validadas: LRU en memoria con TTL + nivel SQLite opcional ---
+class CacheRespuestas:
+    def __init__(self, capacidad=1000, ttl_s=86400, ruta_sqlite=None):
+        self.capacidad = capacidad
+        self.ttl_s = ttl_s
+        self._memoria = OrderedDict()        # clave -> (expira, json)
+        self._lock = threading.Lock()
+        self._db = None
+        self.aciertos = self.aciertos_disco = self.fallos = 0
+        if ruta_sqlite and capacidad > 0:
+            os.makedirs(os.path.dirname(ruta_sqlite) or '.', exist_ok=True)
+            self._db = sqlite3.connect(ruta_sqlite, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS respuestas (clave TEXT PRIMARY KEY, valor TEXT NOT NULL, expira REAL NOT NULL)"
+            )
+
+    @property
+    def activa(self):
+        return self.capacidad > 0
+
+    def __len__(self):
+        return len(self._memoria)
+
+    def _guardar_memoria(self, clave, expira, valor):
+        self._memoria[clave] = (expira, valor)
+        self._memoria.move_to_end(clave)
+        while len(self._memoria) > self.capacidad:
+            self._memoria.popitem(last=False)
+
+    def obtener(self, clave):
+        if not self.activa:
+            return None
+        ahora = time.time()
+        with self._lock:
+            entrada = self._memoria.get(clave)
+            if entrada and entrada[0] > ahora:
+                self._memoria.move_to_end(clave)
+                self.aciertos += 1
+                return json.loads(entrada[1])
+            self._memoria.pop(clave, None)
+            if self._db is not None:
+                fila = self._db.execute(
+                    "SELECT valor, expira FROM respuestas WHERE clave = ? AND expira > ?", (clave, ahora)
+                ).fetchone()
+                if fila:
+                    self._guardar_memoria(clave, fila[1], fila[0])
+                    self.aciertos += 1
+                    self.aciertos_disco += 1
+                    return json.loads(fila[0])
+            self.fallos += 1
+            return None
+
+    def guardar(self, clave, respuesta):
+        # Sólo deben llegar aquí respuestas ya validadas
+        if not self.activa:
+            return
+        valor = json.dumps(respuesta, ensure_ascii=False)
+        expira = time.time() + self.ttl_s
+        with self._lock:
+            self._guardar_memoria(clave, expira, valor)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO respuestas (clave, valor, expira) VALUES (?, ?, ?)", (clave, valor, expira)
+                )
+
+    def estadisticas(self):
+        total = self.aciertos + self.fallos
+        return {
+            'entradas': len(self._memoria),
+            'capacidad': self.capacidad,
+            'aciertos': self.aciertos,
+            'aciertos_disco': self.aciertos_disco,
+            'fallos': self.fallos,
+            'tasa_aciertos': self.aciertos / total if total else 0.0,
+        }
@@ -0,0 +1,58 @@
+import os
+import threading
+
+import numpy as np
+
+from app.optimizador import KCAL_G
+
+COLUMNAS = ['Energía (kcal)', 'Carbohidratos disponibles (g)', 'Proteínas totales (g)', 'Grasa total (g)']
+
+
+# --- Catálogo de platos completos en arrays, recargado sólo si cambia el mtime ---
+class CatalogoPlatos:
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._mtime = None
+        self._datos = None
+        self._lock = threading.Lock()
+
+    def _cargar(self):
+        import pandas as pd
+
+        dfp = pd.read_csv(self.ruta)
+        nombres = dfp['NOMBRE DEL ALIMENTO'].astype(str).to_numpy(dtype=object)
+        macros = dfp[COLUMNAS].apply(pd.to_numeric, errors='coerce').fillna(0).to_numpy(dtype=np.float64)
+        E = macros[:, :1]
+        kcal = macros[:, 1:] * np.array(list(KCAL_G.values()), dtype=np.float64)
+        # Porcentajes precalculados; un plato sin energía queda en 0 % en vez de dividir por cero
+        with np.errstate(divide='ignore', invalid='ignore'):
+            porcentajes = np.where(E > 0, kcal / E * 100, 0.0)
+        return nombres, macros, porcentajes
+
+    def datos(self):
+        mtime = os.stat(self.ruta).st_mtime_ns
+        if self._datos is None or mtime != self._mtime:
+            with self._lock:
+                if self._datos is None or mtime != self._mtime:
+                    self._datos = self._cargar()
+                    self._mtime = mtime
+        return self._datos
+
+    def __len__(self):
+        return len(self.datos()[0])
+
+    def muestrear(self, num=3, rng=None):
+        nombres, macros, porcentajes = self.datos()
+        if len(nombres) == 0:
+            return []
+        # Un solo sorteo vectorizado (con reemplazo, como los antiguos sample(1) sucesivos)
+        idx = (rng or np.random.default_rng()).integers(0, len(nombres), size=num)
+        res = []
+        for i in idx:
+            E, C, P, F = macros[i].tolist()
+            res.append({
+                'Plato': nombres[i], 'Energía': E,
+                'Carbohidratos': C, 'Proteínas': P, 'Grasas': F,
+                'Porcentajes': dict(zip(KCAL_G, porcentajes[i].tolist())),
+            })
+        return res
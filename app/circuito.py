@@ -0,0 +1,50 @@
+import threading
+import time
+
+
+# --- Circuit breaker de proceso: tras N fallos seguidos deja de llamar al servicio ---
+class Circuito:
+    def __init__(self, nombre, umbral_fallos=5, enfriamiento_s=30):
+        self.nombre = nombre
+        self.umbral_fallos = umbral_fallos
+        self.enfriamiento_s = enfriamiento_s
+        self._fallos = 0
+        self._abierto_hasta = None      # time.monotonic(); None = cerrado
+        self._lock = threading.Lock()
+
+    @property
+    def abierto(self):
+        return self._abierto_hasta is not None
+
+    def reintentar_en(self):
+        with self._lock:
+            if self._abierto_hasta is None:
+                return 0.0
+            return max(0.0, self._abierto_hasta - time.monotonic())
+
+    def permitir(self):
+        # Abierto: sólo pasa una llamada de prueba por cada periodo de enfriamiento
+        with self._lock:
+            if self._abierto_hasta is None:
+                return True
+            ahora = time.monotonic()
+            if ahora < self._abierto_hasta:
+                return False
+            self._abierto_hasta = ahora + self.enfriamiento_s
+            print(f"[INFO] Circuito {self.nombre}: llamada de prueba")
+            return True
+
+    def exito(self):
+        with self._lock:
+            if self._abierto_hasta is not None:
+                print(f"[INFO] Circuito {self.nombre} cerrado: el servicio responde de nuevo")
+            self._fallos = 0
+            self._abierto_hasta = None
+
+    def fallo(self):
+        with self._lock:
+            self._fallos += 1
+            if self._fallos >= self.umbral_fallos:
+                if self._abierto_hasta is None:
+                    print(f"[WARN] Circuito {self.nombre} abierto tras {self._fallos} fallos seguidos")
+                self._abierto_hasta = time.monotonic() + self.enfriamiento_s
@@ -0,0 +1,212 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Mapping
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from sklearn.preprocessing import MinMaxScaler
+    from sklearn.cluster import KMeans
+
+
+# --- Snapshot inmutable de un clustering ya ajustado ---
+@dataclass(frozen=True)
+class ClusterSnapshot:
+    clave: tuple
+    scaler: MinMaxScaler | None          # None si los labels se adoptaron de memoria compartida
+    modelo: KMeans | None
+    labels: np.ndarray                   # cluster de cada fila (sólo lectura)
+    posiciones: Mapping[int, np.ndarray] # cluster -> posiciones de sus ingredientes en la matriz
+    huella: str | None = None            # huella de las filas ajustadas/asignadas (ver huella_filas)
+    asignadas: int = 0                   # filas asignadas a centroides existentes desde el último ajuste
+
+    def mayor_cluster(self):
+        return max(self.posiciones.values(), key=len)
+
+
+def clave_clusters(huella, n_clusters, numeric_cols):
+    # Huella del almacén cargado (no el CSV en disco): el modelo corresponde siempre a la matriz en
+    # memoria y sólo se invalida con otra tabla de ingredientes o con otro CLUSTERS
+    return (huella, int(n_clusters), tuple(numeric_cols))
+
+
+def huella_filas(matriz, n=None):
+    # Identifica las n primeras filas: detecta si una tabla nueva sólo añade filas al final
+    filas = np.ascontiguousarray(matriz[:len(matriz) if n is None else n])
+    return hashlib.blake2b(filas.tobytes(), digest_size=16).hexdigest()
+
+
+def ajustar(matriz, n_clusters, modo='kmeans', lote=4096):
+    if modo == 'minibatch':
+        return _ajustar_minibatch(matriz, n_clusters, lote)
+    from sklearn.preprocessing import MinMaxScaler
+    from sklearn.cluster import KMeans
+
+    scaler = MinMaxScaler()
+    X = scaler.fit_transform(matriz)
+    model = KMeans(n_clusters=n_clusters, init='k-means++', n_init=10, max_iter=300, random_state=0)
+    labels = model.fit_predict(X)
+    return {'scaler': scaler, 'modelo': model, 'labels': labels}
+
+
+def _ajustar_minibatch(matriz, n_clusters, lote=4096, epocas=3):
+    # partial_fit por lotes: memoria O(lote) en vez de escalar y ajustar la tabla entera de una vez
+    from sklearn.preprocessing import MinMaxScaler
+    from sklearn.cluster import MiniBatchKMeans
+
+    lote = max(lote, n_clusters)
+    scaler = MinMaxScaler()
+    for i in range(0, len(matriz), lote):
+        scaler.partial_fit(matriz[i:i + lote])
+    model = MiniBatchKMeans(n_clusters=n_clusters, batch_size=lote, n_init=3, random_state=0)
+    rng = np.random.default_rng(0)
+    for _ in range(epocas):
+        # Lotes en orden aleatorio: las tablas regionales concatenadas no sesgan los primeros centroides
+        orden = rng.permutation(len(matriz))
+        for i in range(0, len(orden), lote):
+            model.partial_fit(scaler.transform(matriz[np.sort(orden[i:i + lote])]))
+    return {'scaler': scaler, 'modelo': model, 'labels': asignar(model, scaler, matriz, lote)}
+
+
+def asignar(modelo, scaler, filas, lote=4096):
+    # Centroide más cercano de cada fila, por lotes y sin reajustar
+    if len(filas) == 0:
+        return np.empty(0, dtype=np.int32)
+    return np.concatenate([
+        modelo.predict(scaler.transform(filas[i:i + lote])).astype(np.int32) for i in range(0, len(filas), lote)
+    ])
+
+
+def _snapshot(clave, ajuste):
+    labels = np.asarray(ajuste['labels'], dtype=np.int32)
+    labels.setflags(write=False)
+    n_clusters = clave[1]
+    posiciones = {}
+    for i in range(n_clusters):
+        posiciones[i] = np.flatnonzero(labels == i)
+        posiciones[i].setflags(write=False)
+    return ClusterSnapshot(
+        clave=clave,
+        scaler=ajuste['scaler'],
+        modelo=ajuste['modelo'],
+        labels=labels,
+        posiciones=MappingProxyType(posiciones),
+        huella=ajuste.get('huella'),
+        asignadas=ajuste.get('asignadas', 0),
+    )
+
+
+# --- Servicio: ajusta una vez y reutiliza el snapshot entre requests ---
+class ServicioClusters:
+    def __init__(self, ruta_modelo=None, modo='kmeans', lote=4096):
+        self.ruta_modelo = ruta_modelo
+        self.modo = modo                    # 'kmeans' (ajuste completo) | 'minibatch' (partial_fit, incremental)
+        self.lote = lote
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    def obtener(self, matriz, numeric_cols, n_clusters, huella):
+        clave = clave_clusters(huella, n_clusters, numeric_cols)
+        snap = self._snapshot
+        if snap is not None and snap.clave == clave:
+            return snap
+        with self._lock:
+            snap = self._snapshot
+            if snap is None or snap.clave != clave:
+                snap = _snapshot(clave, self._cargar_o_ajustar(matriz, clave, snap))
+                self._snapshot = snap
+        return snap
+
+    def adoptar(self, labels, numeric_cols, n_clusters, huella):
+        # Labels ya calculados por otro proceso (memoria compartida): sin modelo local.
+        # Misma clave que obtener(): los workers no vuelven a ajustar
+        clave = clave_clusters(huella, n_clusters, numeric_cols)
+        with self._lock:
+            if self._snapshot is None or self._snapshot.clave != clave:
+                self._snapshot = _snapshot(clave, {'scaler': None, 'modelo': None, 'labels': labels})
+        return self._snapshot
+
+    def pendiente_reajuste(self):
+        snap = self._snapshot
+        return snap is not None and snap.modelo is not None and snap.asignadas > 0
+
+    def reajustar(self, matriz):
+        # Ajuste completo fuera del lock (p. ej. en segundo plano); el snapshot se sustituye de una vez
+        snap = self._snapshot
+        if snap is None or snap.modelo is None:
+            return snap
+        print(f"[INFO] Reajustando clusters ({self.modo}) sobre {len(matriz)} ingredientes...")
+        ajuste = self._ajuste_completo(matriz, snap.clave[1])
+        with self._lock:
+            if self._snapshot is not snap:
+                print("[INFO] Reajuste descartado: los clusters cambiaron mientras tanto")
+                return self._snapshot
+            self._snapshot = _snapshot(snap.clave, ajuste)
+            self._persistir(snap.clave, ajuste)
+        return self._snapshot
+
+    def _ajuste_completo(self, matriz, n_clusters):
+        return {**ajustar(matriz, n_clusters, self.modo, self.lote), 'huella': huella_filas(matriz)}
+
+    def _incremental(self, matriz, clave, base):
+        # base: snapshot en memoria o modelo persistido. Si la tabla sólo añade filas al final,
+        # las nuevas van al centroide más cercano y el reajuste completo queda para reajustar()
+        if base is None or base['modelo'] is None or base['clave'][1:] != clave[1:]:
+            return None
+        n = len(base['labels'])
+        if n > len(matriz) or base.get('huella') != huella_filas(matriz, n):
+            return None
+        nuevas = asignar(base['modelo'], base['scaler'], matriz[n:], self.lote)
+        if len(nuevas):
+            print(f"[INFO] {len(nuevas)} ingredientes nuevos asignados a los centroides existentes")
+        return {
+            'scaler': base['scaler'],
+            'modelo': base['modelo'],
+            'labels': np.concatenate([base['labels'], nuevas]),
+            'huella': huella_filas(matriz) if len(nuevas) else base['huella'],
+            'asignadas': base.get('asignadas', 0) + len(nuevas),
+        }
+
+    def _cargar_o_ajustar(self, matriz, clave, actual=None):
+        import joblib
+
+        guardado = None
+        if self.ruta_modelo and os.path.exists(self.ruta_modelo):
+            try:
+                guardado = joblib.load(self.ruta_modelo)
+                if guardado.get('clave') == clave and len(guardado['labels']) == len(matriz):
+                    print(f"[INFO] Clusters cargados desde {self.ruta_modelo}")
+                    return guardado
+            except Exception as e:
+                guardado = None
+                print(f"[WARN] No se pudo leer el modelo de clusters persistido: {e}")
+
+        if self.modo == 'minibatch':
+            en_memoria = actual and {
+                'clave': actual.clave, 'scaler': actual.scaler, 'modelo': actual.modelo,
+                'labels': actual.labels, 'huella': actual.huella, 'asignadas': actual.asignadas,
+            }
+            for base in (en_memoria, guardado):
+                ajuste = self._incremental(matriz, clave, base)
+                if ajuste is not None:
+                    self._persistir(clave, ajuste)
+                    return ajuste
+
+        print(f"[INFO] Ajustando {self.modo} con {clave[1]} clusters sobre {len(matriz)} ingredientes...")
+        ajuste = self._ajuste_completo(matriz, clave[1])
+        self._persistir(clave, ajuste)
+        return ajuste
+
+    def _persistir(self, clave, ajuste):
+        import joblib
+
+        if self.ruta_modelo:
+            try:
+                joblib.dump({'clave': clave, **ajuste}, self.ruta_modelo)
+            except OSError as e:
+                print(f"[WARN] No se pudo persistir el modelo de clusters: {e}")
@@ -0,0 +1,91 @@
+import fcntl
+import json
+import os
+import shutil
+
+import numpy as np
+
+from app.almacen import VERSION_CACHE, AlmacenIngredientes, cargar_almacen, huella_archivo
+
+
+# --- Publicación de arrays en un directorio mmap-eable (p. ej. /dev/shm) compartido entre workers ---
+def _destino(directorio, huella, n_clusters):
+    return os.path.join(directorio, f"{huella[:16]}-k{n_clusters}-v{VERSION_CACHE}")
+
+
+def adjuntar(destino):
+    # Vistas de sólo lectura sobre los ficheros: ninguna copia por worker
+    with open(os.path.join(destino, 'meta.json'), encoding='utf-8') as f:
+        nombres = json.load(f)['arrays']
+    return {n: np.load(os.path.join(destino, f"{n}.npy"), mmap_mode='r') for n in nombres}
+
+
+def _publicar(directorio, destino, arrays):
+    tmp = f"{destino}.tmp{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    for nombre, arr in arrays.items():
+        np.save(os.path.join(tmp, f"{nombre}.npy"), np.asarray(arr))
+    with open(os.path.join(tmp, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump({'arrays': sorted(arrays)}, f)
+    # El rename es atómico: un destino existente siempre está completo
+    os.rename(tmp, destino)
+
+    # Versiones anteriores: los workers que aún las tengan mapeadas no se ven afectados
+    for otro in os.listdir(directorio):
+        ruta = os.path.join(directorio, otro)
+        if ruta != destino and not otro.startswith('.') and os.path.isdir(ruta):
+            shutil.rmtree(ruta, ignore_errors=True)
+
+
+def publicar_o_adjuntar(directorio, huella, n_clusters, construir):
+    # construir() -> dict de arrays; sólo lo ejecuta el primer proceso que llega
+    destino = _destino(directorio, huella, n_clusters)
+    if not os.path.isdir(destino):
+        os.makedirs(directorio, exist_ok=True)
+        with open(os.path.join(directorio, '.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                if not os.path.isdir(destino):
+                    print(f"[INFO] Publicando ingredientes en memoria compartida: {destino}")
+                    _publicar(directorio, destino, construir())
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+    print(f"[INFO] Adjuntando ingredientes compartidos (sólo lectura): {destino}")
+    return adjuntar(destino)
+
+
+def cargar_almacen_compartido(ruta, cache_dir, directorio, n_clusters, clusters=None):
+    # El publicador parsea/ajusta una sola vez; el resto de workers sólo mapea los ficheros.
+    # clusters=None (AFINIDAD='vecinos'): se publica sin labels y sin ajustar nada
+    if clusters is None:
+        n_clusters = 0
+
+    def construir():
+        almacen = cargar_almacen(ruta, cache_dir)
+        if clusters is None:
+            return almacen.arrays()
+        snap = clusters.obtener(almacen.matriz, almacen.columnas, n_clusters, almacen.huella)
+        return {**almacen.arrays(), 'labels': snap.labels}
+
+    arrays = publicar_o_adjuntar(directorio, huella_archivo(ruta), n_clusters, construir)
+    almacen = AlmacenIngredientes.desde_arrays(arrays)
+    if clusters is not None:
+        clusters.adoptar(arrays['labels'], almacen.columnas, n_clusters, almacen.huella)
+    return almacen
+
+
+if __name__ == "__main__":
+    # Publicar antes de arrancar uvicorn: python -m app.compartido
+    from app.clusters import ServicioClusters
+    from app.settings import settings
+
+    if not settings.MEMORIA_COMPARTIDA_DIR:
+        raise SystemExit("Define MEMORIA_COMPARTIDA_DIR para publicar los ingredientes.")
+    servicio = None
+    if settings.AFINIDAD != 'vecinos':
+        servicio = ServicioClusters(settings.CLUSTERS_MODEL_PATH, settings.CLUSTERS_MODO, settings.CLUSTERS_LOTE)
+    cargar_almacen_compartido(
+        settings.INGREDIENTES_CSV, settings.INGREDIENTES_CACHE_DIR, settings.MEMORIA_COMPARTIDA_DIR,
+        settings.CLUSTERS, servicio,
+    )
@@ -0,0 +1,121 @@
+import numpy as np
+
+from app.nutricion import MACROS
+from app.optimizador import KCAL_G
+from app.presupuesto import agotado
+
+
+def cuotas_energia(motor):
+    # % de energía que aporta cada macro en cada ingrediente (n, 3); 0 si no tiene energía
+    cols = [motor.columna(MACROS[mac]) for mac in ('Calorías', *KCAL_G)]
+    if any(j is None for j in cols):
+        raise KeyError("Faltan columnas de energía o macronutrientes en la BD.")
+    E = motor.matriz[:, cols[0]]
+    kcal = motor.matriz[:, cols[1:]] * np.array(list(KCAL_G.values()), dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cuotas = np.where(E[:, None] > 0, kcal / E[:, None] * 100, 0.0)
+    return cuotas
+
+
+# --- Cribado vectorizado de subconjuntos candidatos antes de llamar a Gemini ---
+def cribar_candidatos(cuotas, pool, objetivos, n_candidatos=2000, min_ing=3, max_ing=7, top=5, rng=None,
+                      grafo=None, n_semillas=8):
+    rng = rng or np.random.default_rng()
+    if grafo is not None:
+        # Caminatas por el grafo kNN desde unas pocas semillas del pool (de toda la tabla si pool es None):
+        # con semillas por todo el candidato el mejor puntuado caería siempre en la misma zona
+        max_ing = min(max_ing, len(grafo))
+        if len(grafo) < min_ing or (pool is not None and len(pool) == 0):
+            return []
+        n_pool = len(grafo) if pool is None else len(pool)
+        semillas = rng.integers(0, n_pool, max(1, n_semillas))
+        if pool is not None:
+            semillas = np.asarray(pool)[semillas]
+        pos = grafo.caminatas(n_candidatos, max_ing, rng, semillas[rng.integers(0, len(semillas), n_candidatos)])
+    else:
+        pool = np.asarray(pool)
+        max_ing = min(max_ing, len(pool))
+        if len(pool) < min_ing:
+            return []
+        pos = pool[rng.integers(0, len(pool), size=(n_candidatos, max_ing))]
+
+    # Matriz (m, max_ing) de posiciones + máscara con el tamaño de cada candidato
+    tam = rng.integers(min_ing, max_ing + 1, size=n_candidatos)
+    mask = np.arange(max_ing) < tam[:, None]
+    S = cuotas[pos]                                                # (m, max_ing, 3)
+
+    # Una mezcla sólo puede alcanzar cuotas dentro del rango [min, max] de sus ingredientes
+    lo = np.array([objetivos[mac][0] for mac in KCAL_G], dtype=np.float64)
+    hi = np.array([objetivos[mac][1] for mac in KCAL_G], dtype=np.float64)
+    s_min = np.where(mask[..., None], S, np.inf).min(axis=1)
+    s_max = np.where(mask[..., None], S, -np.inf).max(axis=1)
+    hueco = np.maximum(lo - s_max, 0) + np.maximum(s_min - hi, 0)
+    # Desempate: cercanía de la cuota media al centro de los objetivos
+    media = (S * mask[..., None]).sum(axis=1) / tam[:, None]
+    score = hueco.sum(axis=1) * 100 + np.abs(media - (lo + hi) / 2).sum(axis=1)
+
+    # Candidatos con ingredientes repetidos quedan descartados
+    orden = np.sort(np.where(mask, pos, -1 - np.arange(max_ing)), axis=1)
+    score[(np.diff(orden, axis=1) == 0).any(axis=1)] = np.inf
+
+    mejores = np.argsort(score)[:top]
+    return [pos[i, :tam[i]] for i in mejores if np.isfinite(score[i])]
+
+
+def pick_prototipos_cribados(motor, cuotas, pool, objetivos, n_candidatos=2000, min_ing=3, max_ing=7,
+                             top=5, optimizar=None, limite=None, grafo=None, n_semillas=8):
+    candidatos = cribar_candidatos(
+        cuotas, pool, objetivos, n_candidatos, min_ing, max_ing, top, grafo=grafo, n_semillas=n_semillas,
+    )
+    if not candidatos:
+        print("[ERROR] No hay suficientes ingredientes similares para garantizar afinidad.")
+        return []
+    # Entre los mejores, el primero que el optimizador de porciones puede balancear de verdad;
+    # sin presupuesto se queda el mejor puntuado sin verificar
+    elegido = candidatos[0]
+    if optimizar:
+        for c in candidatos:
+            if agotado(limite):
+                break
+            if optimizar(c)['cumple']:
+                elegido = c
+                break
+    return prototipos_desde_posiciones(motor, elegido)
+
+
+def pick_prototipos_aleatorios(motor, pool, min_ing=3, max_ing=7, rng=None):
+    # Equivalente por posiciones de pick_affine_prototipos (muestra simple del cluster)
+    rng = rng or np.random.default_rng()
+    if len(pool) < min_ing:
+        print("[ERROR] No hay suficientes ingredientes similares para garantizar afinidad.")
+        return []
+    n = int(rng.integers(min_ing, min(max_ing, len(pool)) + 1))
+    return prototipos_desde_posiciones(motor, rng.choice(pool, size=n, replace=False))
+
+
+def pick_prototipos_vecinos(motor, grafo, pool=None, min_ing=3, max_ing=7, rng=None):
+    # Semilla (del pool o de toda la tabla) + caminata por el grafo kNN: O(k) por plato
+    rng = rng or np.random.default_rng()
+    if len(grafo) < min_ing or (pool is not None and len(pool) == 0):
+        print("[ERROR] No hay suficientes ingredientes similares para garantizar afinidad.")
+        return []
+    n = int(rng.integers(min_ing, min(max_ing, len(grafo)) + 1))
+    semilla = None if pool is None else np.asarray(pool)[rng.integers(0, len(pool), 1)]
+    posiciones = list(dict.fromkeys(grafo.caminatas(1, n, rng, semilla)[0].tolist()))
+    if len(posiciones) < min_ing:
+        return []
+    return prototipos_desde_posiciones(motor, posiciones)
+
+
+def prototipos_desde_posiciones(motor, posiciones):
+    protos = []
+    for pos in posiciones:
+        row = motor.como_dict(motor.matriz[pos])
+        protos.append({
+            'name': motor.indice.nombres[pos],
+            'energy': row['Calorías'],
+            'protein': row['Proteínas'],
+            'fat': row['Grasas'],
+            'carbs': row['Carbohidratos'],
+        })
+    return protos
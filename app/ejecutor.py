@@ -0,0 +1,108 @@
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from app import metricas
+
+MODOS = ('hilos', 'procesos', 'ninguno')
+ARRANQUE_TIMEOUT_S = 600                       # espera máxima a que todos los workers carguen sus datos
+
+_barrera = None                                # barrera de arranque, una por pool (en cada worker)
+
+
+class EjecutorSaturado(RuntimeError):
+    def __init__(self, reintentar_en=1.0):
+        super().__init__("Demasiado trabajo de CPU pendiente; reintentar en unos segundos")
+        self.reintentar_en = reintentar_en
+
+
+def _iniciar_proceso(inicializador, barrera):
+    global _barrera
+    _barrera = barrera
+    if inicializador is not None:
+        inicializador()
+
+
+def _esperar_hermanos():
+    # Tarea de arranque: bloquea al worker hasta que los demás toman la suya. Así cada proceso
+    # ejecuta exactamente una y, cuando terminan todas, todos han pasado por el initializer
+    _barrera.wait(ARRANQUE_TIMEOUT_S)
+
+
+# --- Etapas de CPU fuera del event loop: pool de hilos o de procesos con cola acotada ---
+class Ejecutor:
+    def __init__(self, modo='hilos', workers=None, max_cola=64, inicializador=None):
+        if modo not in MODOS:
+            raise ValueError(f"Modo de ejecutor desconocido {modo!r}; opciones: {', '.join(MODOS)}")
+        self.modo = modo
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.max_cola = max_cola
+        self._inicializador = inicializador    # función de módulo que carga los datos en cada proceso
+        self._pool = None
+        self._local = None                     # hilos para tareas que usan estado de este proceso
+        self._arranque = []                    # futuros de las tareas de arranque de los procesos
+        self._lock = threading.Lock()
+        self.pendientes = 0                    # en cola + en ejecución
+        self.rechazadas = 0
+
+    def iniciar(self):
+        if self._pool is not None or self.modo == 'ninguno':
+            return
+        if self.modo == 'procesos':
+            import multiprocessing
+
+            # forkserver: los workers no heredan hilos ni locks del proceso de la API
+            contexto = multiprocessing.get_context('forkserver')
+            self._pool = ProcessPoolExecutor(
+                self.workers, mp_context=contexto, initializer=_iniciar_proceso,
+                initargs=(self._inicializador, contexto.Barrier(self.workers)),
+            )
+            self._local = ThreadPoolExecutor(1, thread_name_prefix='cpu-local')
+            # Arrancar los procesos ya (cargan datos en el initializer) y no en la primera request:
+            # cada submit sin workers libres lanza uno nuevo
+            self._arranque = [self._pool.submit(_esperar_hermanos) for _ in range(self.workers)]
+        else:
+            self._pool = self._local = ThreadPoolExecutor(self.workers, thread_name_prefix='cpu')
+        print(f"[INFO] Ejecutor de CPU: {self.workers} {self.modo}, cola máxima {self.max_cola}")
+
+    async def esperar_arranque(self):
+        # Con procesos: el ejecutor no está listo hasta que todos los workers han cargado sus datos
+        arranque, self._arranque = self._arranque, []
+        await asyncio.gather(*(asyncio.wrap_future(f) for f in arranque))
+
+    def detener(self):
+        for pool in {self._pool, self._local} - {None}:
+            pool.shutdown(wait=False, cancel_futures=True)
+        self._pool = self._local = None
+
+    def _terminada(self, _futuro):
+        with self._lock:
+            self.pendientes -= 1
+
+    async def ejecutar(self, fn, *args, local=False):
+        # local=True: en un hilo de este proceso aunque el modo sea 'procesos' (p. ej. clusters)
+        pool = self._local if local else self._pool
+        if pool is None:
+            return fn(*args)
+        with self._lock:
+            if self.pendientes >= self.workers + self.max_cola:
+                self.rechazadas += 1
+                raise EjecutorSaturado()
+            self.pendientes += 1
+        en_proceso = pool is self._pool and self.modo == 'procesos'
+        if en_proceso:
+            # El worker no ve el contexto de la request: devuelve sus etapas con el resultado
+            futuro = pool.submit(metricas.capturar_etapas, fn, *args)
+        else:
+            # Copia del contexto: las etapas siguen sumando al Server-Timing de la request
+            futuro = pool.submit(functools.partial(contextvars.copy_context().run, fn, *args))
+        # El contador baja al terminar de verdad, aunque quien espera se cancele antes
+        futuro.add_done_callback(self._terminada)
+        if not en_proceso:
+            return await asyncio.wrap_future(futuro)
+        resultado, observadas = await asyncio.wrap_future(futuro)
+        metricas.volcar_etapas(observadas)
+        return resultado
@@ -0,0 +1,156 @@
+from typing import List
+
+from app import metricas
+from app.almacen import cargar_almacen
+from app.cribado import cuotas_energia, pick_prototipos_aleatorios, pick_prototipos_cribados, pick_prototipos_vecinos
+from app.models import Dish, MenuItem
+from app.nutricion import MotorNutricional, MACROS
+from app.optimizador import optimizar_porciones
+from app.procesamiento import calcular_totales_gemini
+from app.settings import settings
+from app.vecinos import cargar_grafo
+
+# Etapas de CPU de /menus/balanced como funciones de módulo (picklables) para el ejecutor.
+# Datos del proceso: los instala la API al arrancar y cada worker del pool de procesos en su initializer.
+_datos = {}
+
+
+def cargar(clusters):
+    # BD de ingredientes una sola vez (almacén compacto con cache .npz).
+    # Con MEMORIA_COMPARTIDA_DIR un solo proceso la publica y el resto la mapea sin copias.
+    if settings.MEMORIA_COMPARTIDA_DIR:
+        from app.compartido import cargar_almacen_compartido
+
+        # Con el grafo kNN no hay clusters que ajustar ni labels que compartir
+        almacen = cargar_almacen_compartido(
+            settings.INGREDIENTES_CSV, settings.INGREDIENTES_CACHE_DIR, settings.MEMORIA_COMPARTIDA_DIR,
+            settings.CLUSTERS, None if settings.AFINIDAD == 'vecinos' else clusters,
+        )
+    else:
+        almacen = cargar_almacen(settings.INGREDIENTES_CSV, settings.INGREDIENTES_CACHE_DIR)
+    motor = MotorNutricional.desde_almacen(almacen)
+    grafo = None
+    if settings.AFINIDAD == 'vecinos':
+        # Grafo kNN de afinidad, cacheado junto al .npz
+        grafo = cargar_grafo(almacen, motor, settings.VECINOS_K, settings.INGREDIENTES_CACHE_DIR)
+    if settings.OPTIMIZAR_PORCIONES:
+        # scipy.optimize tarda ~0,7 s en importarse: aquí y no en el primer plato (antes lo
+        # arrastraba el ajuste de KMeans, que con el grafo kNN ya no se hace)
+        import scipy.optimize  # noqa: F401
+    _datos.update(indice=almacen.indice, motor=motor, cuotas=cuotas_energia(motor), grafo=grafo)
+    return almacen
+
+
+def iniciar_worker():
+    # Initializer del pool de procesos: lee la cache .npz (o mapea la memoria compartida) ya escrita por la API
+    from app.clusters import ServicioClusters
+
+    cargar(ServicioClusters())
+
+
+def porciones(posiciones):
+    return optimizar_porciones(
+        _datos['motor'], posiciones, settings.objetivos_macros,
+        energia_kcal=settings.ENERGIA_PLATO_KCAL,
+        min_g=settings.PORCION_MIN_G, max_g=settings.PORCION_MAX_G,
+    )
+
+
+def muestrear(pool, limite=None):
+    # 2. Muestreo de prototipos afinados (lista vacía si no hay). Con grafo kNN, pool son las
+    # semillas posibles (None = toda la tabla); sin grafo, las posiciones del cluster
+    grafo = _datos['grafo']
+    if settings.CRIBADO_CANDIDATOS > 0:
+        # Cribado de miles de subconjuntos candidatos; sólo los viables llegan a Gemini
+        return pick_prototipos_cribados(
+            _datos['motor'], _datos['cuotas'], pool, settings.objetivos_macros,
+            n_candidatos=settings.CRIBADO_CANDIDATOS,
+            min_ing=settings.PROTOTIPOS_MIN,
+            max_ing=settings.PROTOTIPOS_MAX,
+            top=settings.CRIBADO_TOP,
+            optimizar=porciones if settings.OPTIMIZAR_PORCIONES else None,
+            limite=limite,
+            grafo=grafo,
+            n_semillas=settings.VECINOS_SEMILLAS,
+        )
+    if grafo is not None:
+        return pick_prototipos_vecinos(
+            _datos['motor'], grafo, pool,
+            min_ing=settings.PROTOTIPOS_MIN,
+            max_ing=settings.PROTOTIPOS_MAX
+        )
+    return pick_prototipos_aleatorios(
+        _datos['motor'], pool,
+        min_ing=settings.PROTOTIPOS_MIN,
+        max_ing=settings.PROTOTIPOS_MAX
+    )
+
+
+def _seleccion(data):
+    # 4. Posiciones y gramos de la selección (IngredienteNoEncontrado si Gemini inventa uno)
+    indice = _datos['indice']
+    posiciones = [indice.posicion(n) for n in data['ingredients']]
+    if settings.OPTIMIZAR_PORCIONES:
+        # Gramos elegidos localmente para cumplir TARGET_*; Gemini sólo nombra el plato
+        with metricas.etapa('porciones'):
+            opt = porciones(posiciones)
+        if not opt['cumple']:
+            print(f"[WARN] Sin porciones dentro de objetivos para '{data.get('dish_name')}': {opt['porcentajes']}")
+        weights = opt['weights_g']
+    else:
+        weights = data['weights_g']
+    # Nombres canónicos de la BD (Gemini puede devolver variantes cercanas)
+    selection = [{'name': indice.nombres[p], 'grams': g} for p, g in zip(posiciones, weights)]
+    return posiciones, selection
+
+
+def _plato(data, posiciones, selection, totals):
+    # 5. Mapear a MenuItem (valores por 100 g de la matriz nutricional)
+    motor = _datos['motor']
+    items: List[MenuItem] = []
+    for sel, pos in zip(selection, posiciones):
+        row = motor.como_dict(motor.matriz[pos])
+        items.append(MenuItem(
+            name=sel['name'],
+            energy=row['Calorías'],
+            carbs=row['Carbohidratos'],
+            protein=row['Proteínas'],
+            fat=row['Grasas'],
+            grams=sel['grams']
+        ))
+
+    # 6. Dish con nombre, lista de ítems y totales (macro y micronutrientes)
+    return Dish(
+        dish_name=data.get('dish_name', 'Plato personalizado'),
+        items=items,
+        totals={k: v for k, v in totals.items() if k not in MACROS}
+    )
+
+
+def armar_plato(data):
+    posiciones, selection = _seleccion(data)
+    with metricas.etapa('totales'):
+        totals = calcular_totales_gemini(_datos['motor'], selection)
+    return _plato(data, posiciones, selection, totals)
+
+
+def armar_platos(datos):
+    # Modo lote: los totales de todos los platos en una sola operación sobre la matriz
+    motor = _datos['motor']
+    selecciones = [_seleccion(data) for data in datos]
+    with metricas.etapa('totales'):
+        totales = motor.totales_lote([s for _, s in selecciones], posiciones=[p for p, _ in selecciones])
+    return [
+        _plato(data, posiciones, selection, motor.como_dict(vector))
+        for data, (posiciones, selection), vector in zip(datos, selecciones, totales)
+    ]
+
+
+def plato_local(protos):
+    # Sin Gemini: prototipos + porciones del optimizador con un nombre genérico
+    posiciones = [_datos['indice'].posicion(p['name']) for p in protos]
+    return armar_plato({
+        'dish_name': 'Plato balanceado',
+        'ingredients': [p['name'] for p in protos],
+        'weights_g': porciones(posiciones)['weights_g'],
+    })
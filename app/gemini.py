@@ -0,0 +1,188 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from app import metricas
+from app.admision import Admision, ColaLlena, UnVuelo
+from app.circuito import Circuito
+from app.presupuesto import acotar
+from app.settings import settings
+
+GEMINI_MODEL = "gemini-2.5-flash-preview-04-17"
+
+_cliente = None
+_lock = threading.Lock()
+_latencias = deque(maxlen=200)       # segundos de las últimas llamadas completadas
+MIN_MUESTRAS_P95 = 20
+
+# Compartido por todas las requests (y el pool) del proceso
+circuito = Circuito('Gemini', settings.GEMINI_CIRCUITO_FALLOS, settings.GEMINI_CIRCUITO_ENFRIAMIENTO_S)
+admision = Admision(
+    settings.GEMINI_RPS, settings.GEMINI_RAFAGA, settings.GEMINI_MAX_EN_VUELO, settings.GEMINI_MAX_COLA,
+)
+un_vuelo = UnVuelo()
+
+
+class GeminiNoDisponible(RuntimeError):
+    def __init__(self, reintentar_en):
+        super().__init__(f"Gemini no disponible (circuito abierto); reintentar en {reintentar_en:.0f}s")
+        self.reintentar_en = reintentar_en
+
+
+# --- 1. Un único cliente por proceso: conexiones keep-alive reutilizadas entre llamadas ---
+def cliente():
+    global _cliente
+    if _cliente is None:
+        with _lock:
+            if _cliente is None:
+                import httpx
+                from google.genai import Client, types
+
+                api_key = os.environ.get("GENAI_API_KEY")
+                if not api_key:
+                    raise ValueError("Define GENAI_API_KEY en environment.")
+                limites = httpx.Limits(
+                    max_connections=settings.GEMINI_MAX_CONEXIONES,
+                    max_keepalive_connections=settings.GEMINI_MAX_CONEXIONES,
+                    keepalive_expiry=60,
+                )
+                opciones = types.HttpOptions(
+                    # Backend intercambiable: None = API de Google; p. ej. bench/fake_gemini.py en local
+                    base_url=settings.GEMINI_BASE_URL,
+                    timeout=int(settings.GEMINI_TIMEOUT_S * 1000),
+                    client_args={'limits': limites},
+                    async_client_args={'limits': limites},
+                )
+                _cliente = Client(api_key=api_key, http_options=opciones)
+    return _cliente
+
+
+# --- 2. Umbral de hedging: p95 observado (o el valor configurado mientras hay pocas muestras) ---
+def _registrar_latencia(segundos):
+    _latencias.append(segundos)
+
+
+def umbral_hedge():
+    if settings.GEMINI_HEDGE_S is None:
+        return None
+    if len(_latencias) < MIN_MUESTRAS_P95:
+        return settings.GEMINI_HEDGE_S
+    return float(np.percentile(np.fromiter(_latencias, dtype=np.float64), 95))
+
+
+# --- 3. Backoff exponencial con jitter completo entre reintentos ---
+def espera_reintento(intento):
+    tope = min(settings.GEMINI_BACKOFF_MAX_S, settings.GEMINI_BACKOFF_BASE_S * 2 ** (intento - 1))
+    return random.uniform(0, tope)
+
+
+def _comprobar_circuito():
+    # Con el circuito abierto se falla rápido, sin tocar la red
+    if not circuito.permitir():
+        metricas.llamadas_gemini.inc('circuito_abierto')
+        raise GeminiNoDisponible(circuito.reintentar_en())
+
+
+# --- 4. Llamadas con deadline por intento; timeouts y errores de red cuentan para el circuito ---
+def generar(prompt, parsear):
+    _comprobar_circuito()
+    inicio = time.perf_counter()
+    try:
+        resp = cliente().models.generate_content(model=GEMINI_MODEL, contents=prompt)
+    except Exception as e:
+        print(f"[WARN] Gemini falló: {type(e).__name__}: {e}")
+        metricas.llamadas_gemini.inc('error')
+        circuito.fallo()
+        return None
+    metricas.llamadas_gemini.inc('ok')
+    circuito.exito()
+    _registrar_latencia(time.perf_counter() - inicio)
+    metricas.registrar_etapa('gemini', time.perf_counter() - inicio)
+    with metricas.etapa('parseo'):
+        return parsear(resp)
+
+
+async def _llamar(prompt, parsear, limite=None, respaldo=False):
+    en_cola = time.perf_counter()
+    try:
+        # Cola acotada + token bucket del proceso; el deadline empieza al obtener turno
+        async with admision.turno():
+            inicio = time.perf_counter()
+            metricas.registrar_etapa('gemini_cola', inicio - en_cola)
+            timeout = acotar(settings.GEMINI_TIMEOUT_S, limite)
+            try:
+                resp = await asyncio.wait_for(
+                    cliente().aio.models.generate_content(model=GEMINI_MODEL, contents=prompt),
+                    timeout=timeout,
+                )
+            except asyncio.TimeoutError:
+                if timeout < settings.GEMINI_TIMEOUT_S:
+                    # Deadline recortado por el presupuesto de la request (o del respaldo): no dice
+                    # nada de la salud de Gemini y no cuenta para el circuito
+                    metricas.llamadas_gemini.inc('presupuesto')
+                    return None
+                print(f"[WARN] Gemini no respondió en {timeout:.2f}s")
+                metricas.llamadas_gemini.inc('timeout')
+                circuito.fallo()
+                return None
+            except Exception as e:
+                print(f"[WARN] Gemini falló: {type(e).__name__}: {e}")
+                metricas.llamadas_gemini.inc('error')
+                circuito.fallo()
+                return None
+            finally:
+                metricas.registrar_etapa('gemini', time.perf_counter() - inicio)
+    except ColaLlena:
+        metricas.llamadas_gemini.inc('rechazada')
+        if respaldo:
+            return None          # sin hueco para la petición de respaldo: se sigue con la primera
+        raise
+    metricas.llamadas_gemini.inc('ok')
+    circuito.exito()
+    _registrar_latencia(time.perf_counter() - inicio)
+    with metricas.etapa('parseo'):
+        return parsear(resp)
+
+
+async def generar_async(prompt, parsear, limite=None, clave=None):
+    # parsear(resp) -> resultado validado o vacío; con hedging se queda el primero válido.
+    # limite: fin del presupuesto de la request (app/presupuesto.py); acota el deadline del intento.
+    # clave: identidad canónica del trabajo; llamadas en curso con la misma clave comparten una sola
+    _comprobar_circuito()
+    if clave is None:
+        return await _generar_async(prompt, parsear, limite)
+    return await un_vuelo.ejecutar(clave, lambda: _generar_async(prompt, parsear, limite), limite)
+
+
+async def _generar_async(prompt, parsear, limite):
+    primera = asyncio.create_task(_llamar(prompt, parsear, limite))
+    umbral = umbral_hedge()
+    if umbral is None:
+        return await primera
+
+    pendientes = {primera}
+    resultado = None
+    try:
+        done, _ = await asyncio.wait(pendientes, timeout=acotar(umbral, limite))
+        if done:
+            return primera.result()
+        if circuito.abierto or admision.saturada():
+            return await primera
+        print(f"[INFO] Gemini supera {umbral:.2f}s: lanzando petición de respaldo")
+        pendientes.add(asyncio.create_task(_llamar(prompt, parsear, limite, respaldo=True)))
+        while pendientes:
+            done, pendientes = await asyncio.wait(pendientes, return_when=asyncio.FIRST_COMPLETED)
+            for tarea in done:
+                resultado = tarea.result()
+                if resultado:
+                    return resultado
+        return resultado
+    finally:
+        # También si la request se cancela: no quedan llamadas huérfanas
+        for tarea in pendientes:
+            tarea.cancel()
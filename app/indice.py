@@ -0,0 +1,258 @@
+import hashlib
+import re
+import unicodedata
+from difflib import SequenceMatcher
+
+import numpy as np
+
+
+class IngredienteNoEncontrado(LookupError):
+    def __init__(self, nombre):
+        super().__init__(f"Ingrediente no encontrado en la BD: {nombre!r}")
+        self.nombre = nombre
+
+    def __reduce__(self):
+        # Se reconstruye con el nombre original al volver de un worker del pool de procesos
+        return type(self), (self.nombre,)
+
+
+def normalizar_nombre(nombre):
+    return str(nombre).strip().lower()
+
+
+def plegar_nombre(nombre):
+    # Sin tildes, minúsculas y sólo alfanuméricos separados por un espacio
+    sin_tildes = ''.join(c for c in unicodedata.normalize('NFKD', str(nombre)) if not unicodedata.combining(c))
+    return ' '.join(re.findall(r'[a-z0-9ñ]+', sin_tildes.lower()))
+
+
+def empaquetar_textos(textos):
+    # Lista de str -> (bytes UTF-8 concatenados, offsets): compacto y serializable sin pickle
+    codificados = [t.encode('utf-8') for t in textos]
+    offsets = np.zeros(len(codificados) + 1, dtype=np.int64)
+    np.cumsum([len(c) for c in codificados], out=offsets[1:])
+    return np.frombuffer(b''.join(codificados), dtype=np.uint8), offsets
+
+
+def hash_texto(texto):
+    # Estable entre procesos (hash() de Python lleva semilla aleatoria por proceso)
+    return int.from_bytes(hashlib.blake2b(texto.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+# --- Textos empaquetados vistos como secuencia: se decodifica sólo el elemento pedido ---
+class TextosEmpaquetados:
+    def __init__(self, blob, offsets):
+        self.blob = blob                  # uint8 (puede ser un mmap de sólo lectura)
+        self.offsets = offsets            # int64, len + 1
+
+    @classmethod
+    def desde_lista(cls, textos):
+        return cls(*empaquetar_textos(textos))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        a, b = self.offsets[i], self.offsets[i + 1]
+        return self.blob[a:b].tobytes().decode('utf-8')
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+
+# --- Tabla hash en arrays: hashes ordenados + ids, búsqueda con searchsorted ---
+class TablaHash:
+    def __init__(self, hashes, ids):
+        self.hashes = hashes              # uint64 ordenados
+        self.ids = ids                    # int32: a igual hash, por id creciente
+
+    @classmethod
+    def construir(cls, claves):
+        # Ante claves repetidas la búsqueda devuelve el id menor
+        hashes = np.fromiter((hash_texto(c) for c in claves), dtype=np.uint64, count=len(claves))
+        orden = np.lexsort((np.arange(len(hashes)), hashes)).astype(np.int32)
+        return cls(hashes[orden], orden)
+
+    def buscar(self, clave, textos, transformar=None):
+        # Los candidatos con el mismo hash se confirman contra el texto original (colisiones)
+        h = np.uint64(hash_texto(clave))
+        i = int(np.searchsorted(self.hashes, h))
+        while i < len(self.hashes) and self.hashes[i] == h:
+            j = int(self.ids[i])
+            texto = textos[j]
+            if (transformar(texto) if transformar else texto) == clave:
+                return j
+            i += 1
+        return None
+
+
+def trigramas(plegado):
+    s = f"  {plegado} "
+    return {s[i:i + 3] for i in range(len(s) - 2)}
+
+
+# --- Resolutor difuso: índice invertido de trigramas sobre los nombres plegados ---
+# Todo el estado son arrays (exportables y mapeables de sólo lectura entre procesos)
+class ResolutorNombres:
+    def __init__(self, nombres):
+        plegados = []
+        posiciones = []               # id de nombre plegado -> primera posición de fila
+        vistos = set()
+        postings = {}
+        for pos, nombre in enumerate(nombres):
+            plegado = plegar_nombre(nombre)
+            if not plegado or plegado in vistos:
+                continue
+            vistos.add(plegado)
+            for tri in trigramas(plegado):
+                postings.setdefault(tri, []).append(len(plegados))
+            plegados.append(plegado)
+            posiciones.append(pos)
+        # Forma CSR (claves ordenadas, offsets, ids) para serializar el índice sin pickle
+        claves = sorted(postings)
+        largos = [len(postings[t]) for t in claves]
+        exacto = TablaHash.construir(plegados)
+        blob, blob_off = empaquetar_textos(plegados)
+        self._instalar({
+            'res_plegados': blob,
+            'res_plegados_off': blob_off,
+            'res_posiciones': np.array(posiciones, dtype=np.int32),
+            'res_hashes': exacto.hashes,
+            'res_hash_ids': exacto.ids,
+            'res_trigramas': np.array(claves, dtype='U3'),
+            'res_offsets': np.concatenate([[0], np.cumsum(largos)]).astype(np.int64),
+            'res_ids': np.concatenate([np.array(postings[t], dtype=np.int32) for t in claves] or [np.zeros(0, np.int32)]),
+            'res_n_trigramas': np.array([len(trigramas(p)) for p in plegados], dtype=np.int32),
+        })
+
+    @classmethod
+    def desde_arrays(cls, arrays):
+        self = cls.__new__(cls)
+        self._instalar(arrays)
+        return self
+
+    def _instalar(self, arrays):
+        # Sin copias: con arrays mapeados de memoria compartida cada proceso sólo guarda vistas
+        arrays = self._arrays = {k: arrays[k] for k in CLAVES_RESOLUTOR}
+        self.plegados = TextosEmpaquetados(arrays['res_plegados'], arrays['res_plegados_off'])
+        self.posiciones = arrays['res_posiciones']
+        self.exacto = TablaHash(arrays['res_hashes'], arrays['res_hash_ids'])
+        self.trigramas = arrays['res_trigramas']
+        self.offsets = arrays['res_offsets']
+        self.ids = arrays['res_ids']
+        self.n_trigramas = arrays['res_n_trigramas']
+        self.max_posting = max(1000, len(self.plegados) // 20)
+
+    def exportar(self):
+        return dict(self._arrays)
+
+    def _postings(self, q):
+        # Listas de ids de los trigramas de q presentes en el índice (búsqueda binaria en las claves)
+        q = np.array(sorted(q), dtype='U3')
+        i = np.searchsorted(self.trigramas, q)
+        i = i[(i < len(self.trigramas)) & (self.trigramas[np.minimum(i, len(self.trigramas) - 1)] == q)]
+        return [self.ids[self.offsets[j]:self.offsets[j + 1]] for j in i.tolist()]
+
+    def candidatos(self, nombre, limite=5, preseleccion=5):
+        plegado = plegar_nombre(nombre)
+        i = self.exacto.buscar(plegado, self.plegados)
+        if i is not None:
+            return [(int(self.posiciones[i]), 1.0)]
+        q = trigramas(plegado)
+        listas = self._postings(q) if len(self.trigramas) else []
+        if not listas:
+            return []
+        # Los trigramas muy comunes (" de", "do "...) apenas discriminan: se omiten en tablas grandes
+        listas = [l for l in listas if len(l) <= self.max_posting] or listas
+        # Trigramas compartidos por cada nombre -> coeficiente de Dice (sólo sobre los que comparten alguno)
+        comunes = np.bincount(np.concatenate(listas), minlength=len(self.plegados))
+        ids = np.flatnonzero(comunes)
+        dice = 2.0 * comunes[ids] / (len(q) + self.n_trigramas[ids])
+        k = min(preseleccion, len(ids))
+        top = ids[np.argpartition(-dice, k - 1)[:k]]
+        # Reordenar la preselección con la misma métrica que difflib
+        ranking = sorted(
+            ((SequenceMatcher(None, plegado, self.plegados[i]).ratio(), int(i)) for i in top),
+            reverse=True,
+        )
+        return [(int(self.posiciones[i]), score) for score, i in ranking[:limite]]
+
+
+CLAVES_RESOLUTOR = (
+    'res_plegados', 'res_plegados_off', 'res_posiciones', 'res_hashes', 'res_hash_ids',
+    'res_trigramas', 'res_offsets', 'res_ids', 'res_n_trigramas',
+)
+
+
+# --- Índice nombre -> posición de fila (exacto y normalizado) con tablas hash en arrays ---
+class IndiceNombres:
+    def __init__(self, nombres, umbral_difuso=0.85, resolutor=None, tablas=None):
+        # nombres: lista de str o TextosEmpaquetados (mapeados); tablas: TablaHash ya exportadas
+        self.nombres = nombres if isinstance(nombres, TextosEmpaquetados) else list(nombres)
+        if tablas is None:
+            # Ante duplicados gana la primera fila, igual que el antiguo .iloc[0]
+            tablas = (
+                TablaHash.construir(self.nombres),
+                TablaHash.construir([normalizar_nombre(n) for n in self.nombres]),
+            )
+        self.exacto, self.normalizado = tablas
+        self.umbral_difuso = umbral_difuso
+        self.resolutor = resolutor or ResolutorNombres(self.nombres)
+
+    def exportar(self):
+        return {
+            'idx_hashes': self.exacto.hashes,
+            'idx_ids': self.exacto.ids,
+            'idx_norm_hashes': self.normalizado.hashes,
+            'idx_norm_ids': self.normalizado.ids,
+            **self.resolutor.exportar(),
+        }
+
+    @classmethod
+    def desde_arrays(cls, nombres, arrays, umbral_difuso=0.85):
+        return cls(
+            nombres, umbral_difuso,
+            resolutor=ResolutorNombres.desde_arrays(arrays),
+            tablas=(
+                TablaHash(arrays['idx_hashes'], arrays['idx_ids']),
+                TablaHash(arrays['idx_norm_hashes'], arrays['idx_norm_ids']),
+            ),
+        )
+
+    def __len__(self):
+        return len(self.nombres)
+
+    def _buscar(self, nombre):
+        pos = self.exacto.buscar(nombre, self.nombres)
+        if pos is None:
+            pos = self.normalizado.buscar(normalizar_nombre(nombre), self.nombres, normalizar_nombre)
+        return pos
+
+    def __contains__(self, nombre):
+        return self._buscar(nombre) is not None
+
+    def candidatos(self, nombre, limite=5):
+        return [(pos, self.nombres[pos], score) for pos, score in self.resolutor.candidatos(nombre, limite)]
+
+    def _difuso(self, nombre):
+        if self.umbral_difuso is None:
+            return None
+        mejores = self.resolutor.candidatos(nombre, limite=1)
+        if mejores and mejores[0][1] >= self.umbral_difuso:
+            return mejores[0][0]
+        return None
+
+    def resolver(self, nombre):
+        # Como posicion() pero sin avisos ni excepción: None si el nombre no se resuelve
+        pos = self._buscar(nombre)
+        return self._difuso(nombre) if pos is None else pos
+
+    def posicion(self, nombre):
+        pos = self._buscar(nombre)
+        if pos is None:
+            pos = self._difuso(nombre)
+            if pos is not None:
+                print(f"[INFO] Ingrediente '{nombre}' no encontrado exactamente, usando coincidencia cercana: '{self.nombres[pos]}'")
+        if pos is None:
+            raise IngredienteNoEncontrado(nombre)
+        return pos
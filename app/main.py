@@ -1,82 +1,438 @@
 from fastapi.middleware.cors import CORSMiddleware
-import uuid, json
-from fastapi import FastAPI, HTTPException
-from typing import List
+import uuid, json, asyncio, time
+from contextlib import aclosing, asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import PlainTextResponse, StreamingResponse
 
 from app.models import MenuRequest, MenuResponse, Dish, MenuItem, Order
+from app.clusters import ServicioClusters
+from app.admision import ColaLlena
+from app import etapas
+from app.ejecutor import Ejecutor, EjecutorSaturado
+from app import gemini
+from app.gemini import (
+    GeminiNoDisponible,
+    admision as gemini_admision,
+    circuito as gemini_circuito,
+    un_vuelo as gemini_un_vuelo,
+)
+from app.indice import IngredienteNoEncontrado
+from app import metricas
+from app.pool import PoolPlatos
+from app.presupuesto import agotado, limite_desde, restante
 from app.procesamiento import (
-    cargar_ingredientes,
-    cluster_ingredientes,
-    pick_affine_prototipos,
-    ask_gemini_to_select,
-    calcular_totales_gemini,
+    ask_gemini_to_select_async,
+    ask_gemini_to_select_batch_async,
+    cache_respuestas,
     generar_platos_completos,
+    catalogo_platos,
 )
 from app.settings import settings
 
-app = FastAPI(title="Menús API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # La carga de datos corre en un hilo: el proceso acepta conexiones (y /ready) desde el principio
+    carga = asyncio.create_task(_arrancar())
+    reajuste = None
+    if settings.CLUSTERS_REAJUSTE_S and settings.MEMORIA_COMPARTIDA_DIR:
+        # Las etiquetas publicadas son de todos los workers: reajustarlas en uno solo las desincronizaría
+        print("[WARN] CLUSTERS_REAJUSTE_S se ignora con MEMORIA_COMPARTIDA_DIR; los clusters se reajustan al volver a publicar")
+    elif settings.CLUSTERS_REAJUSTE_S:
+        reajuste = asyncio.create_task(_reajustar_clusters())
+    yield
+    carga.cancel()
+    if reajuste:
+        reajuste.cancel()
+    await pool.detener()
+    ejecutor.detener()
+
+
+app = FastAPI(title="Menús API", lifespan=lifespan)
+
+@app.middleware("http")
+async def medir_request(request: Request, call_next):
+    # Latencia por ruta y cabecera Server-Timing con las etapas medidas durante la request
+    tiempos = metricas.iniciar_request()
+    inicio = time.perf_counter()
+    response = await call_next(request)
+    segundos = time.perf_counter() - inicio
+    ruta = request.scope.get('route')
+    metricas.duracion_http.observar(segundos, ruta.path if ruta else 'otra', response.status_code)
+    tiempos['total'] = segundos * 1000
+    response.headers['Server-Timing'] = metricas.server_timing(tiempos)
+    return response
+
 
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:3000"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
+)
+
+# Clusters: se ajustan (o adoptan) al arrancar; las requests sólo leen el snapshot
+clusters = ServicioClusters(settings.CLUSTERS_MODEL_PATH, settings.CLUSTERS_MODO, settings.CLUSTERS_LOTE)
+
+# Etapas de CPU (muestreo, optimizador, totales, clusters) fuera del event loop
+ejecutor = Ejecutor(
+    settings.EJECUTOR, settings.EJECUTOR_WORKERS, settings.EJECUTOR_MAX_COLA, inicializador=etapas.iniciar_worker,
+)
+
+# Datos cargados en el lifespan (ver _cargar_datos); None hasta que la app está lista
+almacen = None
+listo = False
+error_arranque = None      # motivo si la carga falló: la API no va a estar lista sin reiniciar
+
+
+def _cargar_datos():
+    global almacen
+    almacen = etapas.cargar(clusters)
+    if settings.AFINIDAD != 'vecinos':
+        _snapshot_clusters()
+
+    # Catálogo de platos completos en memoria (se recarga sólo si cambia el CSV). Sólo lo usa
+    # /menus/complete: si falta o es inválido se avisa y se vuelve a intentar en su primera request
+    try:
+        catalogo_platos(settings.PLATOS_CSV).datos()
+    except Exception as e:
+        print(f"[WARN] No se pudo cargar el catálogo de platos al arrancar: {e!r}")
+
+    # Cliente de Gemini (import de google-genai + contexto SSL, ~1 s): aquí y no en la primera request
+    try:
+        gemini.cliente()
+    except Exception as e:
+        print(f"[WARN] No se pudo crear el cliente de Gemini al arrancar: {e!r}")
+
+
+async def _arrancar():
+    global listo, error_arranque
+    try:
+        await asyncio.to_thread(_cargar_datos)
+    except Exception as e:
+        print(f"[ERROR] No se pudieron cargar los datos: {e!r}")
+        error_arranque = f"No se pudieron cargar los datos: {e}"
+        return
+    # Los workers del pool de procesos leen la cache ya escrita: se arranca después de cargar
+    # y la API no se marca lista hasta que todos han terminado su initializer
+    ejecutor.iniciar()
+    try:
+        await ejecutor.esperar_arranque()
+    except Exception as e:
+        print(f"[ERROR] No arrancaron los workers del ejecutor: {e!r}")
+        error_arranque = f"No arrancaron los workers del ejecutor: {e!r}"
+        return
+    listo = True
+    print("[INFO] Datos cargados; la API está lista.")
+    pool.iniciar()
+
+
+async def _reajustar_clusters():
+    # Ingredientes asignados a centroides existentes (modo minibatch): reajuste completo periódico
+    # en un hilo aparte; las requests siguen con el snapshot anterior hasta el cambio atómico
+    while True:
+        await asyncio.sleep(settings.CLUSTERS_REAJUSTE_S)
+        if listo and clusters.pendiente_reajuste():
+            try:
+                await asyncio.to_thread(clusters.reajustar, almacen.matriz)
+            except Exception as e:
+                print(f"[WARN] Reajuste de clusters fallido: {e!r}")
+
+
+def _requiere_datos():
+    if error_arranque:
+        # Fallo definitivo: se informa la causa real (sin Retry-After, reintentar no sirve)
+        raise HTTPException(status_code=503, detail=error_arranque)
+    if not listo:
+        raise HTTPException(status_code=503, detail="La API aún está cargando datos.", headers={"Retry-After": "1"})
+
+
+def _snapshot_clusters():
+    # Ligado al almacén cargado al arrancar: una tabla nueva (incremental en modo minibatch) se aplica al reiniciar
+    with metricas.etapa('clusters'):
+        return clusters.obtener(almacen.matriz, almacen.columnas, settings.CLUSTERS, almacen.huella)
+
+
+async def _clusters():
+    # Con AFINIDAD='vecinos' el muestreo usa el grafo kNN: ni se ajustan clusters ni se pide snapshot
+    if settings.AFINIDAD == 'vecinos':
+        return None
+    return await _cpu(_snapshot_clusters, local=True)
+
+
+async def _cpu(fn, *args, local=False):
+    # Con la cola del ejecutor llena se responde 503 en vez de acumular trabajo
+    try:
+        return await ejecutor.ejecutar(fn, *args, local=local)
+    except EjecutorSaturado as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(max(1, round(e.reintentar_en)))})
+
+
+async def _armar_plato(data, lote=False):
+    # lote=True: data es la lista de platos del modo lote, armados en una sola tarea
+    try:
+        return await _cpu(etapas.armar_platos if lote else etapas.armar_plato, data)
+    except IngredienteNoEncontrado as e:
+        metricas.fallos_validacion.inc('ingrediente_desconocido')
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+async def _muestrear_prototipos(snap, limite=None):
+    with metricas.etapa('muestreo'):
+        # Con el grafo kNN (sin snapshot) las semillas salen de toda la tabla: cada plato parte de otra zona
+        pool = None if snap is None else snap.mayor_cluster()
+        protos = await _cpu(etapas.muestrear, pool, limite)
+    if not protos:
+        raise HTTPException(status_code=500, detail="No se pudieron muestrear ingredientes por afinidad.")
+    return protos
+
+
+def _demasiadas(e):
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(max(1, round(e.reintentar_en)))})
+
+
+def _admitir(n_platos):
+    # Si las llamadas que faltan tras el pool no caben en la cola de Gemini se rechaza ya,
+    # antes de consumir el pool o muestrear nada (en modo lote es una sola llamada)
+    en_vivo = n_platos - len(pool)
+    if en_vivo > 0:
+        try:
+            gemini_admision.rechazar_si_saturada(1 if settings.GEMINI_BATCH else en_vivo)
+        except ColaLlena as e:
+            raise _demasiadas(e)
+
+
+async def _sin_gemini(e, protos_por_plato, degradar):
+    # Circuito abierto: plato local (prototipos + porciones del optimizador) o 503 inmediato
+    if not (degradar and settings.GEMINI_DEGRADAR):
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(max(1, round(e.reintentar_en)))})
+    return list(await asyncio.gather(*(_cpu(etapas.plato_local, protos) for protos in protos_por_plato)))
+
+
+async def _generar_plato(snap, sem, limite=None, degradar=True):
+    protos = await _muestrear_prototipos(snap, limite)
+
+    # 3. Llamada a Gemini (async) con reintentos de settings y concurrencia acotada
+    try:
+        async with sem:
+            data = await ask_gemini_to_select_async(
+                protos, max_retries=settings.GEMINI_MAX_RETRIES, limite=limite, indice=almacen.indice,
+            )
+    except GeminiNoDisponible as e:
+        return (await _sin_gemini(e, [protos], degradar))[0]
+    except ColaLlena as e:
+        raise _demasiadas(e)
+    if not data:
+        if agotado(limite):
+            return None
+        if gemini_circuito.abierto:
+            # Los reintentos abrieron el circuito: se trata igual que si ya estuviera abierto
+            return (await _sin_gemini(GeminiNoDisponible(gemini_circuito.reintentar_en()), [protos], degradar))[0]
+        raise HTTPException(status_code=502, detail="Gemini no devolvió un plato válido.")
+
+    return await _armar_plato(data)
+
+
+async def _generar_platos_lote(snap, n_platos, limite=None):
+    # 3b. Modo lote: una sola llamada para los n platos, reintentando sólo los fallidos
+    protos = list(await asyncio.gather(*(_muestrear_prototipos(snap, limite) for _ in range(n_platos))))
+    try:
+        datos = await ask_gemini_to_select_batch_async(
+            protos, max_retries=settings.GEMINI_MAX_RETRIES, limite=limite, indice=almacen.indice,
+        )
+    except GeminiNoDisponible as e:
+        return await _sin_gemini(e, protos, degradar=True)
+    except ColaLlena as e:
+        raise _demasiadas(e)
+    if not all(datos) and not agotado(limite):
+        raise HTTPException(status_code=502, detail="Gemini no devolvió un plato válido.")
+    return await _armar_plato([data for data in datos if data], lote=True)
+
+
+async def _platos_a_medida(snap, n_platos, limite=None):
+    # (índice, Dish | None | excepción) en orden de llegada; None = plato sin terminar dentro del presupuesto
+    if settings.GEMINI_BATCH:
+        try:
+            platos = await _generar_platos_lote(snap, n_platos, limite)
+        except HTTPException as e:
+            yield None, e
+            return
+        for i, plato in enumerate(platos):
+            yield i, plato
+        return
+
+    # Una tarea por plato; el semáforo limita las llamadas simultáneas a Gemini
+    sem = asyncio.Semaphore(settings.GEMINI_CONCURRENCIA)
+    tareas = {asyncio.create_task(_generar_plato(snap, sem, limite)): i for i in range(n_platos)}
+    pendientes = set(tareas)
+    try:
+        while pendientes:
+            hechas, pendientes = await asyncio.wait(
+                pendientes, timeout=restante(limite), return_when=asyncio.FIRST_COMPLETED,
+            )
+            if not hechas:
+                break        # presupuesto agotado: lo pendiente se cancela
+            for t in sorted(hechas, key=tareas.get):
+                yield tareas[t], t.exception() or t.result()
+    finally:
+        for t in tareas:
+            t.cancel()
+
+
+async def _generar_platos(snap, n_platos, limite=None):
+    # Devuelve sólo los platos terminados antes de agotar el presupuesto (limite);
+    # el primer error (p. ej. 502) se propaga como antes y cancela el resto
+    platos = []
+    async with aclosing(_platos_a_medida(snap, n_platos, limite)) as llegadas:
+        async for i, res in llegadas:
+            if isinstance(res, BaseException):
+                raise res
+            if res is not None:
+                platos.append((i, res))
+    return [plato for _, plato in sorted(platos, key=lambda x: x[0])]
+
+
+async def _producir_plato_pool():
+    snap = await _clusters()
+    # El pool sólo guarda platos de Gemini: con el circuito abierto el productor espera
+    return await _generar_plato(snap, sem_pool, degradar=False)
+
+
+# Pool de platos pregenerados (POOL_PLATOS=0 lo desactiva)
+sem_pool = asyncio.Semaphore(settings.POOL_CONCURRENCIA)
+pool = PoolPlatos(
+    _producir_plato_pool,
+    tamano=settings.POOL_PLATOS,
+    umbral_recarga=settings.POOL_UMBRAL_RECARGA,
+    concurrencia=settings.POOL_CONCURRENCIA,
+)
+
+# Estado leído al exportar /metrics (pool, ejecutor de CPU, admisión, circuito y cache de Gemini)
+metricas.Medidor('pool_platos', 'Platos pregenerados disponibles', lambda: len(pool))
+metricas.Medidor('ejecutor_pendientes', 'Etapas de CPU en cola o en ejecución', lambda: ejecutor.pendientes)
+metricas.Medidor(
+    'ejecutor_rechazadas_total', 'Etapas de CPU rechazadas con 503', lambda: ejecutor.rechazadas, tipo='counter',
 )
+metricas.Medidor('gemini_en_cola', 'Llamadas a Gemini esperando turno', lambda: gemini_admision.en_cola)
+metricas.Medidor('gemini_en_vuelo', 'Llamadas a Gemini en curso', lambda: gemini_admision.en_vuelo)
+metricas.Medidor(
+    'gemini_rechazadas_total', 'Llamadas o requests rechazadas con 429', lambda: gemini_admision.rechazadas, tipo='counter',
+)
+metricas.Medidor('gemini_circuito_abierto', 'Circuito de Gemini abierto (1) o cerrado (0)', lambda: int(gemini_circuito.abierto))
+metricas.Medidor(
+    'gemini_fusionadas_total', 'Llamadas idénticas servidas por otra en curso', lambda: gemini_un_vuelo.fusionadas,
+    tipo='counter',
+)
+metricas.Medidor(
+    'gemini_cache_total', 'Consultas a la cache de respuestas de Gemini',
+    lambda: {
+        ('memoria',): cache_respuestas.aciertos - cache_respuestas.aciertos_disco,
+        ('disco',): cache_respuestas.aciertos_disco,
+        ('fallo',): cache_respuestas.fallos,
+    },
+    etiquetas=('resultado',), tipo='counter',
+)
+
+
+@app.get("/ready")
+async def ready():
+    # Probe de readiness: 503 mientras se cargan ingredientes y clusters (el catálogo es opcional),
+    # con la causa si la carga falló
+    _requiere_datos()
+    return {"status": "ok"}
+
+
+@app.get("/metrics")
+async def metrics():
+    # Formato de texto de Prometheus
+    return PlainTextResponse(metricas.exportar(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/cache/gemini")
+async def cache_gemini():
+    # Aciertos/fallos de la cache de respuestas, para dimensionar GEMINI_CACHE_MAX
+    return cache_respuestas.estadisticas()
 
-# Precargamos la BD de ingredientes una sola vez
-df_ing, num_cols = cargar_ingredientes(settings.INGREDIENTES_CSV)
 
 @app.post("/menus/balanced", response_model=MenuResponse)
 async def generate_balanced_menu(req: MenuRequest):
-    dishes = []
+    _requiere_datos()
+    # Presupuesto de latencia: al agotarse se devuelve lo terminado con parcial=True
+    limite = limite_desde(req.presupuesto_s or settings.PRESUPUESTO_MENU_S)
+    _admitir(req.n_platos)
+    # 0. Servir primero desde el pool; sólo lo que falte se genera en vivo
+    dishes = pool.tomar(req.n_platos)
+    if len(dishes) < req.n_platos:
+        # 1. Snapshot de clusters (ajustado al arrancar para el almacén cargado; None con el grafo kNN)
+        snap = await _clusters()
+        dishes += await _generar_platos(snap, req.n_platos - len(dishes), limite)
 
-    for _ in range(req.n_platos):
-        # 1. Clustering con el nº de clusters de settings
-        cluster_map, _ = cluster_ingredientes(df_ing, num_cols, n_clusters=settings.CLUSTERS)
+    return MenuResponse(dishes=dishes, parcial=len(dishes) < req.n_platos)
 
-        # 2. Muestreo de prototipos afinados
-        protos = pick_affine_prototipos(
-            cluster_map,
-            min_ing=settings.PROTOTIPOS_MIN,
-            max_ing=settings.PROTOTIPOS_MAX
-        )
-        if not protos:
-            raise HTTPException(status_code=500, detail="No se pudieron muestrear ingredientes por afinidad.")
-
-        # 3. Llamada a Gemini con reintentos de settings
-        data = ask_gemini_to_select(protos, max_retries=settings.GEMINI_MAX_RETRIES)
-        if not data:
-            raise HTTPException(status_code=502, detail="Gemini no devolvió un plato válido.")
-
-        # 4. Construir la selección y calcular totales
-        selection = [{'name': n, 'grams': g} for n, g in zip(data['ingredients'], data['weights_g'])]
-        totals = calcular_totales_gemini(df_ing, selection)
-
-        # 5. Mapear a MenuItem
-        items: List[MenuItem] = []
-        for sel in selection:
-            row = df_ing[df_ing['NOMBRE DEL ALIMENTO'] == sel['name']].iloc[0]
-            items.append(MenuItem(
-                name=sel['name'],
-                energy=float(row['Energía (kcal)']),
-                carbs=float(row['Carbohidratos disponibles (g)']),
-                protein=float(row['Proteínas totales (g)']),
-                fat=float(row['Grasa total (g)']),
-                grams=sel['grams']
-            ))
-
-        # 6. Añadir Dish con nombre y lista de ítems
-        dishes.append(Dish(
-            dish_name=data.get('dish_name', 'Plato personalizado'),
-            items=items
-        ))
 
-    return MenuResponse(dishes=dishes)
+def _evento(tipo, datos, sse):
+    linea = json.dumps({'type': tipo, **datos}, ensure_ascii=False)
+    return f"event: {tipo}\ndata: {linea}\n\n" if sse else linea + "\n"
+
+
+async def _eventos_menu(n_platos, desde_pool, snap, limite, sse):
+    # Un evento 'dish' por plato en cuanto está validado y totalizado; 'index' es su posición en el menú
+    inicio = time.perf_counter()
+    entregados, errores = [], []
+    for i, dish in enumerate(desde_pool):
+        entregados.append(i)
+        yield _evento('dish', {'index': i, 'source': 'pool', 'dish': jsonable_encoder(dish)}, sse)
+
+    if len(desde_pool) < n_platos:
+        async with aclosing(_platos_a_medida(snap, n_platos - len(desde_pool), limite)) as llegadas:
+            async for i, res in llegadas:
+                idx = None if i is None else len(desde_pool) + i
+                if isinstance(res, HTTPException):
+                    # El status HTTP ya se envió: el fallo de un plato viaja como evento y el resto sigue
+                    errores.append(idx)
+                    yield _evento('error', {'index': idx, 'status': res.status_code, 'detail': res.detail}, sse)
+                elif isinstance(res, BaseException):
+                    print(f"[ERROR] Plato {idx} falló: {res!r}")
+                    errores.append(idx)
+                    yield _evento('error', {'index': idx, 'status': 500, 'detail': 'Error interno.'}, sse)
+                elif res is not None:
+                    entregados.append(idx)
+                    yield _evento('dish', {'index': idx, 'source': 'live', 'dish': jsonable_encoder(res)}, sse)
+
+    yield _evento('summary', {
+        'n_platos': n_platos,
+        'indices': sorted(entregados),
+        'errores': len(errores),
+        'parcial': len(entregados) < n_platos,
+        'ms': round((time.perf_counter() - inicio) * 1000, 1),
+    }, sse)
+
+
+@app.post("/menus/balanced/stream")
+async def stream_balanced_menu(req: MenuRequest, request: Request):
+    # Igual que /menus/balanced pero emitiendo cada plato al terminarlo (NDJSON, o SSE con Accept: text/event-stream)
+    _requiere_datos()
+    limite = limite_desde(req.presupuesto_s or settings.PRESUPUESTO_MENU_S)
+    _admitir(req.n_platos)
+    sse = 'text/event-stream' in request.headers.get('accept', '')
+    # El snapshot se pide antes de enviar las cabeceras: si el ejecutor está saturado aún se responde 503
+    snap = await _clusters() if len(pool) < req.n_platos else None
+    return StreamingResponse(
+        _eventos_menu(req.n_platos, pool.tomar(req.n_platos), snap, limite, sse),
+        media_type='text/event-stream' if sse else 'application/x-ndjson',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
 
 
 @app.post("/menus/complete", response_model=MenuResponse)
 async def generate_complete_menu(req: MenuRequest):
-    raw = generar_platos_completos(settings.PLATOS_CSV, req.n_platos)
+    _requiere_datos()
+    try:
+        raw = generar_platos_completos(settings.PLATOS_CSV, req.n_platos)
+    except (OSError, KeyError, ValueError) as e:
+        print(f"[ERROR] Catálogo de platos no disponible: {e!r}")
+        raise HTTPException(status_code=503, detail="Catálogo de platos no disponible.")
     dishes = []
 
     for plato in raw:
@@ -0,0 +1,163 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+LATENCIAS_S = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_registro = []
+# Tiempos por etapa de la request en curso (ms acumulados) para la cabecera Server-Timing
+_tiempos_request = ContextVar('tiempos_request', default=None)
+# En un worker de procesos: etapas observadas en la tarea en curso, para devolverlas a la API
+_etapas_worker = ContextVar('etapas_worker', default=None)
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _etiquetas(nombres, valores):
+    if not nombres:
+        return ''
+    return '{' + ','.join(f'{n}="{_escapar(v)}"' for n, v in zip(nombres, valores)) + '}'
+
+
+def _numero(v):
+    return str(int(v)) if float(v).is_integer() else repr(float(v))
+
+
+# --- Métricas en memoria con exportación en formato de texto de Prometheus ---
+class Contador:
+    tipo = 'counter'
+
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre, self.ayuda, self.etiquetas = nombre, ayuda, tuple(etiquetas)
+        self._valores = {}
+        self._lock = threading.Lock()
+        _registro.append(self)
+
+    def inc(self, *valores, n=1):
+        with self._lock:
+            self._valores[valores] = self._valores.get(valores, 0) + n
+
+    def lineas(self):
+        with self._lock:
+            items = sorted(self._valores.items())
+        return [f"{self.nombre}{_etiquetas(self.etiquetas, k)} {_numero(v)}" for k, v in items]
+
+
+class Histograma:
+    tipo = 'histogram'
+
+    def __init__(self, nombre, ayuda, etiquetas=(), buckets=LATENCIAS_S):
+        self.nombre, self.ayuda, self.etiquetas = nombre, ayuda, tuple(etiquetas)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}         # etiquetas -> [conteos por bucket (+Inf al final), suma]
+        self._lock = threading.Lock()
+        _registro.append(self)
+
+    def observar(self, valor, *valores):
+        i = bisect.bisect_left(self.buckets, valor)
+        with self._lock:
+            serie = self._series.get(valores)
+            if serie is None:
+                serie = self._series[valores] = [[0] * (len(self.buckets) + 1), 0.0]
+            serie[0][i] += 1
+            serie[1] += valor
+
+    def lineas(self):
+        with self._lock:
+            items = sorted((k, (list(c), s)) for k, (c, s) in self._series.items())
+        lineas = []
+        for k, (conteos, suma) in items:
+            acumulado = 0
+            for le, c in zip((*map(_numero, self.buckets), '+Inf'), conteos):
+                acumulado += c
+                lineas.append(f"{self.nombre}_bucket{_etiquetas((*self.etiquetas, 'le'), (*k, le))} {acumulado}")
+            lineas.append(f"{self.nombre}_sum{_etiquetas(self.etiquetas, k)} {_numero(suma)}")
+            lineas.append(f"{self.nombre}_count{_etiquetas(self.etiquetas, k)} {acumulado}")
+        return lineas
+
+
+class Medidor:
+    # Valor leído al exportar: fn() -> número o dict {tupla de etiquetas: número}
+    def __init__(self, nombre, ayuda, fn, etiquetas=(), tipo='gauge'):
+        self.nombre, self.ayuda, self.etiquetas, self.tipo = nombre, ayuda, tuple(etiquetas), tipo
+        self._fn = fn
+        _registro.append(self)
+
+    def lineas(self):
+        valor = self._fn()
+        if not isinstance(valor, dict):
+            valor = {(): valor}
+        return [f"{self.nombre}{_etiquetas(self.etiquetas, k)} {_numero(v)}" for k, v in sorted(valor.items())]
+
+
+def exportar():
+    lineas = []
+    for m in _registro:
+        try:
+            cuerpo = m.lineas()
+        except Exception as e:
+            print(f"[WARN] Métrica {m.nombre} no disponible: {e!r}")
+            continue
+        lineas += [f"# HELP {m.nombre} {m.ayuda}", f"# TYPE {m.nombre} {m.tipo}", *cuerpo]
+    return '\n'.join(lineas) + '\n'
+
+
+# --- Métricas de la API ---
+duracion_etapa = Histograma('menus_etapa_segundos', 'Latencia por etapa de la generación de menús', ('etapa',))
+duracion_http = Histograma('http_request_segundos', 'Latencia de las requests HTTP', ('ruta', 'status'))
+intentos_plato = Histograma(
+    'gemini_intentos_por_plato', 'Intentos a Gemini hasta obtener (o no) cada plato', buckets=(1, 2, 3, 4, 5, 7, 10),
+)
+llamadas_gemini = Contador('gemini_llamadas_total', 'Llamadas a Gemini por resultado', ('resultado',))
+fallos_validacion = Contador('validacion_fallos_total', 'Respuestas descartadas por motivo', ('motivo',))
+
+
+def registrar_etapa(nombre, segundos):
+    observadas = _etapas_worker.get()
+    if observadas is not None:
+        # El registro de este proceso no se exporta: se vuelca en la API con volcar_etapas
+        observadas.append((nombre, segundos))
+        return
+    duracion_etapa.observar(segundos, nombre)
+    tiempos = _tiempos_request.get()
+    if tiempos is not None:
+        tiempos[nombre] = tiempos.get(nombre, 0.0) + segundos * 1000
+
+
+@contextmanager
+def etapa(nombre):
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        registrar_etapa(nombre, time.perf_counter() - inicio)
+
+
+def capturar_etapas(fn, *args):
+    # Se ejecuta en el worker: devuelve el resultado junto con las etapas medidas
+    observadas = []
+    token = _etapas_worker.set(observadas)
+    try:
+        return fn(*args), observadas
+    finally:
+        _etapas_worker.reset(token)
+
+
+def volcar_etapas(observadas):
+    for nombre, segundos in observadas:
+        registrar_etapa(nombre, segundos)
+
+
+def iniciar_request():
+    tiempos = {}
+    _tiempos_request.set(tiempos)
+    return tiempos
+
+
+def server_timing(tiempos):
+    # Las etapas de platos en paralelo se suman: 'dur' es tiempo acumulado, no de pared
+    return ', '.join(f"{nombre};dur={ms:.1f}" for nombre, ms in tiempos.items())
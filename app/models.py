@@ -1,8 +1,11 @@
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
+
+from app.settings import settings
 
 class MenuRequest(BaseModel):
-    n_platos: int = 3
+    n_platos: int = Field(3, ge=1, le=settings.MAX_PLATOS)   # acotado: cada plato es trabajo de CPU y de Gemini
+    presupuesto_s: Optional[float] = Field(None, gt=0)   # segundos; None = PRESUPUESTO_MENU_S
     # más adelante: include/exclude lists
 
 class MenuItem(BaseModel):
@@ -16,9 +19,11 @@ class MenuItem(BaseModel):
 class Dish(BaseModel):
     dish_name: str
     items: List[MenuItem]
+    totals: Optional[Dict[str, float]] = None   # totales del plato por columna nutricional
 
 class MenuResponse(BaseModel):
     dishes: List[Dish]
+    parcial: bool = False   # True si el presupuesto se agotó antes de completar n_platos
 
 class Order(BaseModel):
     menu_id: str
@@ -0,0 +1,70 @@
+import numpy as np
+
+# Claves históricas de los totales -> columna de la BD
+MACROS = {
+    'Calorías': 'Energía (kcal)',
+    'Carbohidratos': 'Carbohidratos disponibles (g)',
+    'Proteínas': 'Proteínas totales (g)',
+    'Grasas': 'Grasa total (g)',
+}
+
+
+# --- Motor nutricional: tabla de ingredientes como matriz contigua (por 100 g) ---
+class MotorNutricional:
+    def __init__(self, matriz, columnas, indice):
+        # Se respeta float32 si viene del almacén compacto; cualquier otro tipo pasa a float64
+        dtype = matriz.dtype if np.issubdtype(matriz.dtype, np.floating) else np.float64
+        self.matriz = np.ascontiguousarray(matriz, dtype=dtype)
+        self.columnas = list(columnas)
+        self.indice = indice
+        self._col = {c: j for j, c in enumerate(self.columnas)}
+
+    @classmethod
+    def desde_df(cls, df, numeric_cols, indice):
+        return cls(df[numeric_cols].to_numpy(dtype=np.float64), numeric_cols, indice)
+
+    @classmethod
+    def desde_almacen(cls, almacen):
+        return cls(almacen.matriz, almacen.columnas, almacen.indice)
+
+    def columna(self, nombre):
+        return self._col.get(nombre)
+
+    def posiciones_y_gramos(self, selection):
+        pos = np.fromiter((self.indice.posicion(s['name']) for s in selection), dtype=np.intp, count=len(selection))
+        gramos = np.fromiter((float(s['grams']) for s in selection), dtype=np.float64, count=len(selection))
+        return pos, gramos
+
+    def totales(self, selection):
+        # Un plato: vector de gramos x filas de la matriz -> los 17 nutrientes a la vez
+        pos, gramos = self.posiciones_y_gramos(selection)
+        return (gramos / 100.0) @ self.matriz[pos]
+
+    def totales_lote(self, selecciones, posiciones=None):
+        # Muchos platos: contribuciones de todas las filas en un solo gather y suma por tramos (reduceat).
+        # posiciones: las de cada selección si ya se resolvieron, para no buscar los nombres otra vez
+        if posiciones is None:
+            pos, gramos = zip(*map(self.posiciones_y_gramos, selecciones)) if selecciones else ((), ())
+        else:
+            pos = [np.asarray(p, dtype=np.intp) for p in posiciones]
+            gramos = [np.array([float(s['grams']) for s in sel], dtype=np.float64) for sel in selecciones]
+        totales = np.zeros((len(selecciones), len(self.columnas)))
+        largos = np.array([len(p) for p in pos], dtype=np.intp)
+        llenos = largos > 0
+        if llenos.any():
+            contrib = self.matriz[np.concatenate(pos)] * (np.concatenate(gramos) / 100.0)[:, None]
+            # Los tramos vacíos no se pasan a reduceat (devolvería la fila siguiente en vez de 0)
+            totales[llenos] = np.add.reduceat(contrib, (np.cumsum(largos) - largos)[llenos], axis=0)
+        return totales
+
+    def como_dict(self, vector):
+        if self.matriz.dtype == np.float32:
+            # float32 sólo guarda ~7 cifras: se redondea para no exponer ruido (21.200000762...)
+            vector = np.round(np.asarray(vector, dtype=np.float64), 4)
+        totals = {clave: 0.0 for clave in MACROS}
+        for clave, col in MACROS.items():
+            j = self._col.get(col)
+            if j is not None:
+                totals[clave] = float(vector[j])
+        totals.update({c: float(v) for c, v in zip(self.columnas, vector)})
+        return totals
@@ -0,0 +1,78 @@
+import numpy as np
+
+from app.nutricion import MACROS
+
+# kcal por gramo de cada macronutriente
+KCAL_G = {'Carbohidratos': 4, 'Proteínas': 4, 'Grasas': 9}
+
+
+def porcentajes_energia(totals):
+    # % de la energía del plato aportado por cada macro (0 si el plato no tiene energía)
+    E = totals['Calorías']
+    if E <= 0:
+        return {mac: 0.0 for mac in KCAL_G}
+    return {mac: totals[mac] * kcal / E * 100 for mac, kcal in KCAL_G.items()}
+
+
+def cumple_objetivos(porcentajes, objetivos):
+    return all(lo <= porcentajes[mac] <= hi for mac, (lo, hi) in objetivos.items())
+
+
+# --- Optimizador local de porciones: LP sobre la matriz nutricional ---
+def optimizar_porciones(motor, posiciones, objetivos, energia_kcal=600, min_g=10, max_g=300, margen=0.5,
+                        tolerancia_kcal=1.0):
+    from scipy.optimize import linprog, lsq_linear
+
+    cols = [motor.columna(MACROS[mac]) for mac in ('Calorías', *KCAL_G)]
+    if any(j is None for j in cols):
+        raise KeyError("Faltan columnas de energía o macronutrientes en la BD.")
+    M = motor.matriz[np.asarray(posiciones)][:, cols].T / 100.0   # (4, k): por gramo
+    E, k = M[0], M.shape[1]
+
+    # Variables [g_1..g_k, t, d_1..d_k]; t >= |E·g - energia_kcal|, d_i >= |g_i - ref|
+    # sujeto a lo% <= kcal_macro·g / E·g <= hi% (restricciones lineales en g)
+    ceros, identidad = np.zeros(k), np.eye(k)
+    A_ub, b_ub = [], []
+    for i, (mac, kcal) in enumerate(KCAL_G.items()):
+        lo, hi = objetivos[mac]
+        A_ub.append(np.concatenate([(lo + margen) / 100 * E - kcal * M[i + 1], [0.0], ceros]))
+        A_ub.append(np.concatenate([kcal * M[i + 1] - (hi - margen) / 100 * E, [0.0], ceros]))
+        b_ub += [0.0, 0.0]
+    A_ub.append(np.concatenate([E, [-1.0], ceros]))
+    A_ub.append(np.concatenate([-E, [-1.0], ceros]))
+    b_ub += [energia_kcal, -energia_kcal]
+    # Reparto de referencia: mismos gramos de cada ingrediente para la energía objetivo
+    ref = float(np.clip(energia_kcal / E.sum(), min_g, max_g)) if E.sum() > 0 else float(min_g)
+    columna_t = np.zeros((k, 1))
+    A_ub = np.vstack(A_ub + [np.hstack([identidad, columna_t, -identidad]), np.hstack([-identidad, columna_t, -identidad])])
+    b_ub = np.array(b_ub + [ref] * k + [-ref] * k)
+    bounds = [(min_g, max_g)] * k + [(0, None)] + [(0, None)] * k
+
+    # 1º la energía; 2º, sin empeorarla, lo más cerca posible del reparto de referencia
+    # (sólo con la energía el LP devuelve vértices con muchos ingredientes en min_g)
+    res = linprog(np.concatenate([ceros, [1.0], ceros]), A_ub=A_ub, b_ub=b_ub, bounds=bounds, method='highs')
+    if res.status == 0:
+        bounds[k] = (0, res.x[k] + tolerancia_kcal)
+        reparto = linprog(
+            np.concatenate([ceros, [0.0], np.ones(k)]), A_ub=A_ub, b_ub=b_ub, bounds=bounds, method='highs',
+        )
+        if reparto.status == 0:
+            res = reparto
+
+    if res.status == 0:
+        gramos = res.x[:k]
+    else:
+        # Sin solución factible: reparto más cercano por mínimos cuadrados acotados
+        A = np.vstack([E] + [M[i + 1] * kcal for i, kcal in enumerate(KCAL_G.values())])
+        b = np.array([energia_kcal] + [energia_kcal * sum(objetivos[mac]) / 200 for mac in KCAL_G])
+        escala = np.where(b > 0, b, 1.0)
+        gramos = lsq_linear(A / escala[:, None], b / escala, bounds=(min_g, max_g)).x
+
+    gramos = np.clip(np.round(gramos), min_g, max_g)
+    totals = dict(zip(('Calorías', *KCAL_G), (M @ gramos).tolist()))
+    porcentajes = porcentajes_energia(totals)
+    return {
+        'weights_g': [int(g) for g in gramos],
+        'porcentajes': porcentajes,
+        'cumple': cumple_objetivos(porcentajes, objetivos),
+    }
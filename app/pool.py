@@ -0,0 +1,62 @@
+import asyncio
+from collections import deque
+
+
+# --- Pool de platos validados, rellenado en segundo plano ---
+class PoolPlatos:
+    def __init__(self, producir, tamano, umbral_recarga=0, concurrencia=1):
+        self._producir = producir            # async () -> Dish
+        self.tamano = tamano
+        self.umbral_recarga = min(umbral_recarga, tamano)
+        self.concurrencia = max(1, concurrencia)
+        self._platos = deque()
+        self._recargar = asyncio.Event()
+        self._tarea = None
+
+    def __len__(self):
+        return len(self._platos)
+
+    def tomar(self, n):
+        # Entrega hasta n platos sin esperar; el resto lo genera el endpoint en vivo
+        platos = [self._platos.popleft() for _ in range(min(n, len(self._platos)))]
+        if len(self._platos) <= self.umbral_recarga:
+            self._recargar.set()
+        return platos
+
+    def iniciar(self):
+        if self.tamano > 0 and self._tarea is None:
+            self._recargar.set()
+            self._tarea = asyncio.create_task(self._productor())
+
+    async def detener(self):
+        if self._tarea is not None:
+            self._tarea.cancel()
+            try:
+                await self._tarea
+            except asyncio.CancelledError:
+                pass
+            self._tarea = None
+
+    async def _producir_uno(self):
+        try:
+            plato = await self._producir()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[WARN] Pool: no se pudo generar un plato: {e!r}")
+            return False
+        if len(self._platos) < self.tamano:
+            self._platos.append(plato)
+        return True
+
+    async def _productor(self):
+        while True:
+            await self._recargar.wait()
+            self._recargar.clear()
+            # Rellenar hasta el tamaño completo (no sólo hasta el umbral)
+            while len(self._platos) < self.tamano:
+                faltan = min(self.concurrencia, self.tamano - len(self._platos))
+                ok = await asyncio.gather(*(self._producir_uno() for _ in range(faltan)))
+                if not any(ok):
+                    # Gemini falla: esperar antes de volver a intentarlo
+                    await asyncio.sleep(5)
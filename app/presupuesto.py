@@ -0,0 +1,20 @@
+import time
+
+
+# --- Presupuesto de latencia de una request: instante límite absoluto (reloj monotónico) ---
+def limite_desde(segundos):
+    return None if segundos is None else time.monotonic() + segundos
+
+
+def restante(limite):
+    return None if limite is None else max(0.0, limite - time.monotonic())
+
+
+def agotado(limite):
+    return limite is not None and time.monotonic() >= limite
+
+
+def acotar(segundos, limite):
+    # El menor entre un timeout propio y lo que queda del presupuesto
+    queda = restante(limite)
+    return segundos if queda is None else min(segundos, queda)
@@ -1,15 +1,19 @@
 import os
 import re
+import asyncio
 import json
-import pandas as pd
-from sklearn.preprocessing import MinMaxScaler
-from sklearn.cluster import KMeans
-import numpy as np
 import random
 import time
-from dotenv import load_dotenv
 
-from google.genai import Client
+# pandas, sklearn y google-genai se importan al primer uso: importar app.main debe ser barato
+from app import gemini, metricas
+from app.cache_respuestas import CacheRespuestas, clave_respuesta
+from app.catalogo import CatalogoPlatos
+from app.clusters import ajustar
+from app.indice import IndiceNombres
+from app.nutricion import MotorNutricional
+from app.optimizador import optimizar_porciones
+from app.presupuesto import acotar, agotado
 from app.settings import settings
 
 # --- Configure your Gemini API key ---
@@ -17,6 +21,8 @@ os.environ["GENAI_API_KEY"] = settings.GENAI_API_KEY
 
 # --- 1. Load and preprocess ingredients (improved from your test) ---
 def cargar_ingredientes(filepath):
+    import pandas as pd
+
     if not filepath or not os.path.exists(filepath):
         raise FileNotFoundError(f"No se encontró el archivo de ingredientes: {filepath}")
 
@@ -47,13 +53,11 @@ def cargar_ingredientes(filepath):
     if 'NOMBRE DEL ALIMENTO' not in df.columns:
         raise KeyError("Falta la columna 'NOMBRE DEL ALIMENTO'")
 
-    # Convert & clean
-    df[numeric_cols] = (
-        df[numeric_cols]
-        .astype(str)
-        .apply(lambda col: pd.to_numeric(col.str.replace(',', '.', regex=False), errors='coerce'))
-        .fillna(0)
-    )
+    # Convert & clean: sólo las columnas que pandas no pudo leer como número pasan por texto
+    for col in numeric_cols:
+        if not pd.api.types.is_numeric_dtype(df[col]):
+            df[col] = pd.to_numeric(df[col].astype(str).str.replace(',', '.', regex=False), errors='coerce')
+    df[numeric_cols] = df[numeric_cols].fillna(0)
     df['NOMBRE_NORMALIZADO'] = (
         df['NOMBRE DEL ALIMENTO']
         .astype(str)
@@ -62,16 +66,18 @@ def cargar_ingredientes(filepath):
     )
     df = df.dropna(subset=['NOMBRE_NORMALIZADO'])
     df = df[df['NOMBRE_NORMALIZADO'] != '']
-    return df, numeric_cols
+    # Índice nombre -> posición (iloc) construido una sola vez
+    indice = IndiceNombres(df['NOMBRE DEL ALIMENTO'].astype(str).tolist())
+    return df, numeric_cols, indice
 
-# --- 2. Cluster ingredients (unchanged) ---
-def cluster_ingredientes(df, numeric_cols, n_clusters=4):
-    scaler = MinMaxScaler()
-    X = scaler.fit_transform(df[numeric_cols])
-    model = KMeans(n_clusters=n_clusters, init='k-means++', n_init=10, max_iter=300, random_state=0)
-    labels = model.fit_predict(X)
-    df['Cluster'] = labels
-    return {i: df[df.Cluster==i] for i in range(n_clusters)}, X
+# --- 2. Cluster ingredients ---
+def cluster_ingredientes(df, numeric_cols, n_clusters=4, modo='kmeans', lote=4096):
+    # Sin columna 'Cluster': el DataFrame compartido no se modifica, los grupos son vistas por máscara
+    matriz = df[numeric_cols].to_numpy()
+    ajuste = ajustar(matriz, n_clusters, modo, lote)
+    labels = ajuste['labels']
+    X = ajuste['scaler'].transform(matriz)
+    return {i: df[labels == i] for i in range(n_clusters)}, X
 
 # --- 3. Select prototypes with affinity: sample from largest cluster ---
 def pick_affine_prototipos(cluster_map, min_ing=3, max_ing=7):
@@ -94,84 +100,228 @@ def pick_affine_prototipos(cluster_map, min_ing=3, max_ing=7):
     ]
 
 # --- 4. Ask Gemini for coherent Peruvian dish (improved retries & JSON validation) ---
-def ask_gemini_to_select(prototypes, max_retries=5):
-    api_key = os.environ.get("GENAI_API_KEY")
-    if not api_key:
-        raise ValueError("Define GENAI_API_KEY en environment.")
-    client = Client(api_key=api_key)
+# El cliente es único por proceso y cada intento tiene deadline (ver app/gemini.py)
+VERSION_PROMPT_PLATO = "plato-v1"   # subir al cambiar _prompt_plato: invalida la cache de respuestas
+VERSION_PROMPT_LOTE = "lote-v1"     # ídem para _prompt_platos
+
+# Respuestas validadas por conjunto de prototipos (GEMINI_CACHE_MAX=0 la desactiva)
+cache_respuestas = CacheRespuestas(settings.GEMINI_CACHE_MAX, settings.GEMINI_CACHE_TTL_S, settings.GEMINI_CACHE_SQLITE)
+
+def _clave_plato(prototypes, version):
+    # Las respuestas sin gramos (OPTIMIZAR_PORCIONES) no sirven con el optimizador apagado y viceversa
+    if settings.OPTIMIZAR_PORCIONES:
+        version = f"{version}-sin-pesos"
+    return clave_respuesta([p['name'] for p in prototypes], f"{gemini.GEMINI_MODEL}/{version}")
+
+def _campos_plato():
+    # Con OPTIMIZAR_PORCIONES los gramos los elige el optimizador local: a Gemini no se le piden
+    if settings.OPTIMIZAR_PORCIONES:
+        return "\"dish_name\": string, \"ingredients\": [names]"
+    return "\"dish_name\": string, \"ingredients\": [names], \"weights_g\": [integers]"
 
-    prompt = (
+def _prompt_plato(prototypes):
+    return (
         "Eres un chef de cocina peruana; selecciona un plato reconocido y coherente usando SÓLO estos ingredientes:\n"
         f"{json.dumps(prototypes, ensure_ascii=False, indent=2)}\n"
-        "Responde ÚNICAMENTE con un JSON: {\"dish_name\": string, \"ingredients\": [names], \"weights_g\": [integers]}. "
+        f"Responde ÚNICAMENTE con un JSON: {{{_campos_plato()}}}. "
         "Si no es posible, devuelve {}."
     )
 
+def _texto_respuesta(resp):
+    raw = resp.candidates[0].content
+    text = getattr(raw, 'text', None) or ''.join(getattr(p, 'text', '') for p in getattr(raw, 'parts', []))
+    return re.sub(r"^```json|```$", "", text, flags=re.IGNORECASE).strip()
+
+def _plato_valido(data):
+    return (
+        isinstance(data, dict)
+        and 'dish_name' in data
+        and isinstance(data.get('ingredients'), list)
+        and 3 <= len(data['ingredients']) <= 7
+        and (
+            settings.OPTIMIZAR_PORCIONES
+            or isinstance(data.get('weights_g'), list) and len(data['ingredients']) == len(data['weights_g'])
+        )
+    )
+
+def _ingredientes_conocidos(data, indice):
+    # Un nombre que el índice no resuelve invalida la respuesta: se reintenta y nunca se cachea
+    # (si no, cada request con esos prototipos acabaría en 422 sin volver a preguntar)
+    if indice is None:
+        return True
+    desconocidos = [n for n in data['ingredients'] if indice.resolver(str(n)) is None]
+    if desconocidos:
+        print(f"[WARN] Ingredientes que no están en la BD: {desconocidos}")
+        metricas.fallos_validacion.inc('ingrediente_desconocido')
+        return False
+    return True
+
+def _parsear_plato(clean, indice=None):
+    try:
+        data = json.loads(clean)
+    except json.JSONDecodeError:
+        print(f"[WARN] JSON inválido: {clean}")
+        metricas.fallos_validacion.inc('json_invalido')
+        return None
+    if not _plato_valido(data):
+        print(f"[WARN] Formato inválido o ingredientes insuficientes: {data}")
+        metricas.fallos_validacion.inc('formato')
+        return None
+    return data if _ingredientes_conocidos(data, indice) else None
+
+def _parsear_respuesta(resp, indice=None):
+    return _parsear_plato(_texto_respuesta(resp), indice)
+
+def ask_gemini_to_select(prototypes, max_retries=5, indice=None):
+    # indice: IndiceNombres contra el que se validan los ingredientes antes de cachear
+    clave = _clave_plato(prototypes, VERSION_PROMPT_PLATO)
+    data = cache_respuestas.obtener(clave)
+    if data:
+        return data
+    prompt = _prompt_plato(prototypes)
+
     for attempt in range(1, max_retries+1):
         print(f"[INFO] Gemini intento {attempt}/{max_retries}...")
-        resp = client.models.generate_content(
-            model="gemini-2.5-flash-preview-04-17",
-            contents=prompt
-        )
-        raw = resp.candidates[0].content
-        text = getattr(raw, 'text', None) or ''.join(getattr(p, 'text', '') for p in getattr(raw, 'parts', []))
-        clean = re.sub(r"^```json|```$", "", text, flags=re.IGNORECASE).strip()
-        try:
-            data = json.loads(clean)
-            if (
-                isinstance(data, dict)
-                and 'dish_name' in data
-                and isinstance(data.get('ingredients'), list)
-                and isinstance(data.get('weights_g'), list)
-                and len(data['ingredients']) == len(data['weights_g'])
-                and 3 <= len(data['ingredients']) <= 7
-            ):
-                return data
-            else:
-                print(f"[WARN] Formato inválido o ingredientes insuficientes: {data}")
-        except json.JSONDecodeError:
-            print(f"[WARN] JSON inválido: {clean}")
-        time.sleep(2)
+        data = gemini.generar(prompt, lambda resp: _parsear_respuesta(resp, indice))
+        if data:
+            metricas.intentos_plato.observar(attempt)
+            cache_respuestas.guardar(clave, data)
+            return data
+        if attempt < max_retries:
+            time.sleep(gemini.espera_reintento(attempt))
 
     print("[ERROR] Gemini no devolvió un JSON válido tras todos los intentos.")
+    metricas.intentos_plato.observar(max_retries)
     return {}
 
-# --- 5. Compute totals from Gemini selection (unchanged) ---
-def calcular_totales_gemini(df, selection):
-    totals = {'Calorías': 0, 'Carbohidratos': 0, 'Proteínas': 0, 'Grasas': 0}
-    for item in selection:
-        row = df[df['NOMBRE DEL ALIMENTO'] == item['name']].iloc[0]
-        factor = item['grams'] / 100.0
-        totals['Calorías']      += row['Energía (kcal)'] * factor
-        totals['Carbohidratos'] += row['Carbohidratos disponibles (g)'] * factor
-        totals['Proteínas']     += row['Proteínas totales (g)'] * factor
-        totals['Grasas']        += row['Grasa total (g)'] * factor
-    return totals
-
-# --- 6. Generate complete dishes from CSV (unchanged) ---
-def generar_platos_completos(platos_csv, num=3):
-    dfp = pd.read_csv(platos_csv)
-    res = []
-    for _ in range(num):
-        r = dfp.sample(1).iloc[0]
-        E, C, P, F = map(
-            float,
-            [r['Energía (kcal)'], r['Carbohidratos disponibles (g)'],
-             r['Proteínas totales (g)'], r['Grasa total (g)']]
+# --- 4b. Async variant: no bloquea el event loop (cliente aio + backoff con asyncio.sleep) ---
+async def ask_gemini_to_select_async(prototypes, max_retries=5, limite=None, indice=None):
+    clave = _clave_plato(prototypes, VERSION_PROMPT_PLATO)
+    data = cache_respuestas.obtener(clave)
+    if data:
+        return data
+    # Requests con los mismos prototipos (en cualquier orden) comparten la generación entera,
+    # reintentos incluidos, con la misma clave canónica que la cache
+    return await gemini.un_vuelo.ejecutar(
+        clave, lambda: _seleccionar_async(prototypes, clave, max_retries, limite, indice), limite,
+    )
+
+async def _seleccionar_async(prototypes, clave, max_retries, limite, indice):
+    prompt = _prompt_plato(prototypes)
+
+    for attempt in range(1, max_retries+1):
+        if agotado(limite):
+            print("[WARN] Presupuesto de la request agotado; no se reintenta Gemini.")
+            metricas.intentos_plato.observar(attempt - 1)
+            return {}
+        print(f"[INFO] Gemini (async) intento {attempt}/{max_retries}...")
+        data = await gemini.generar_async(prompt, lambda resp: _parsear_respuesta(resp, indice), limite)
+        if data:
+            metricas.intentos_plato.observar(attempt)
+            cache_respuestas.guardar(clave, data)
+            return data
+        # Tras el último intento no se espera: el fallo se informa ya
+        if attempt < max_retries:
+            await asyncio.sleep(acotar(gemini.espera_reintento(attempt), limite))
+
+    print("[ERROR] Gemini no devolvió un JSON válido tras todos los intentos.")
+    metricas.intentos_plato.observar(max_retries)
+    return {}
+
+# --- 4c. Batched mode: todos los platos en una sola llamada estructurada ---
+def _prompt_platos(prototipos_por_plato):
+    grupos = [{'index': i, 'ingredients': protos} for i, protos in prototipos_por_plato]
+    return (
+        "Eres un chef de cocina peruana. Para CADA grupo de ingredientes de la lista, selecciona un plato reconocido "
+        "y coherente usando SÓLO los ingredientes de ese grupo:\n"
+        f"{json.dumps(grupos, ensure_ascii=False, indent=2)}\n"
+        f"Responde ÚNICAMENTE con un JSON: {{\"dishes\": [{{\"index\": int, {_campos_plato()}}}]}}, "
+        "un elemento por grupo con su mismo index. "
+        "Si un grupo no permite un plato, omítelo."
+    )
+
+def _parsear_platos(clean, pendientes, indice=None):
+    try:
+        data = json.loads(clean)
+    except json.JSONDecodeError:
+        print(f"[WARN] JSON inválido: {clean}")
+        metricas.fallos_validacion.inc('json_invalido')
+        return {}
+    dishes = data.get('dishes') if isinstance(data, dict) else None
+    if not isinstance(dishes, list):
+        print(f"[WARN] Respuesta sin lista 'dishes': {data}")
+        metricas.fallos_validacion.inc('sin_lista')
+        return {}
+    validos = {}
+    for d in dishes:
+        # Cada plato se valida por separado; uno inválido no descarta a los demás
+        idx = d.get('index') if isinstance(d, dict) else None
+        if not (idx in pendientes and idx not in validos and _plato_valido(d)):
+            print(f"[WARN] Plato inválido en lote: {d}")
+            metricas.fallos_validacion.inc('formato_lote')
+        elif _ingredientes_conocidos(d, indice):
+            validos[idx] = d
+    return validos
+
+async def ask_gemini_to_select_batch_async(prototipos_por_plato, max_retries=5, limite=None, indice=None):
+    resultados = [{} for _ in prototipos_por_plato]
+    claves = [_clave_plato(protos, VERSION_PROMPT_LOTE) for protos in prototipos_por_plato]
+    pendientes = {}
+    for idx, protos in enumerate(prototipos_por_plato):
+        # Los grupos ya respondidos salen de la cache; sólo el resto va en el lote
+        resultados[idx] = cache_respuestas.obtener(claves[idx]) or {}
+        if not resultados[idx]:
+            pendientes[idx] = protos
+    if not pendientes:
+        return resultados
+
+    for attempt in range(1, max_retries+1):
+        if agotado(limite):
+            print(f"[WARN] Presupuesto de la request agotado con {len(pendientes)} plato(s) pendientes.")
+            for _ in pendientes:
+                metricas.intentos_plato.observar(attempt - 1)
+            return resultados
+        print(f"[INFO] Gemini (lote de {len(pendientes)}) intento {attempt}/{max_retries}...")
+        prompt = _prompt_platos(list(pendientes.items()))
+        validos = await gemini.generar_async(
+            prompt, lambda resp: _parsear_platos(_texto_respuesta(resp), pendientes, indice), limite,
+            clave=(VERSION_PROMPT_LOTE,) + tuple((idx, claves[idx]) for idx in pendientes),
         )
-        res.append({
-            'Plato': r['NOMBRE DEL ALIMENTO'], 'Energía': E,
-            'Carbohidratos': C, 'Proteínas': P, 'Grasas': F,
-            'Porcentajes': {
-                'Carbohidratos': C * 4 / E * 100,
-                'Proteínas':    P * 4 / E * 100,
-                'Grasas':       F * 9 / E * 100
-            }
-        })
-    return res
+        for idx, data in (validos or {}).items():
+            metricas.intentos_plato.observar(attempt)
+            resultados[idx] = data
+            del pendientes[idx]
+            cache_respuestas.guardar(claves[idx], {k: v for k, v in data.items() if k != 'index'})
+        if not pendientes:
+            return resultados
+        # Sólo se vuelven a pedir los platos que fallaron (tras el último intento no se espera)
+        if attempt < max_retries:
+            await asyncio.sleep(acotar(gemini.espera_reintento(attempt), limite))
+
+    print(f"[ERROR] Gemini no devolvió {len(pendientes)} plato(s) válidos tras todos los intentos.")
+    for _ in pendientes:
+        metricas.intentos_plato.observar(max_retries)
+    return resultados
+
+# --- 5. Compute totals from Gemini selection (vectorized, all numeric_cols) ---
+def calcular_totales_gemini(motor, selection):
+    return motor.como_dict(motor.totales(selection))
+
+# --- 6. Generate complete dishes from CSV (catálogo cacheado en memoria) ---
+_catalogos = {}
+
+def catalogo_platos(platos_csv):
+    if platos_csv not in _catalogos:
+        _catalogos[platos_csv] = CatalogoPlatos(platos_csv)
+    return _catalogos[platos_csv]
+
+def generar_platos_completos(platos_csv, num=3):
+    return catalogo_platos(platos_csv).muestrear(num)
 
 # --- 7. Main interface (adapted option 1) ---
 def main():
+    from dotenv import load_dotenv
+
     load_dotenv()
     print("Elija opción (1: Ingredientes balanceados con IA, 2: Platos CSV):")
     try:
@@ -180,43 +330,61 @@ def main():
         print("Opción no válida."); return
 
     if op == 1:
-        df, cols = cargar_ingredientes(settings.INGREDIENTES_CSV)
+        df, cols, indice = cargar_ingredientes(settings.INGREDIENTES_CSV)
+        motor = MotorNutricional.desde_df(df, cols, indice)
         print(f"[INFO] Ingredientes cargados: {len(df)} registros")
-        cluster_map, _ = cluster_ingredientes(df, cols)
-        print(f"[INFO] Ingredientes agrupados en {len(cluster_map)} clusters")
+        if settings.AFINIDAD == 'vecinos':
+            from app.cribado import pick_prototipos_vecinos
+            from app.vecinos import GrafoVecinos
+
+            grafo = GrafoVecinos.construir(motor, settings.VECINOS_K)
+            print(f"[INFO] Grafo de afinidad con {grafo.k} vecinos por ingrediente")
+            muestrear = lambda: pick_prototipos_vecinos(motor, grafo)
+        else:
+            cluster_map, _ = cluster_ingredientes(df, cols, settings.CLUSTERS, settings.CLUSTERS_MODO, settings.CLUSTERS_LOTE)
+            print(f"[INFO] Ingredientes agrupados en {len(cluster_map)} clusters")
+            muestrear = lambda: pick_affine_prototipos(cluster_map)
 
         n = int(input("¿Cuántos platos quieres generar? [3]: ").strip() or 3)
-        objetivos = {'Carbohidratos': (50,60), 'Proteínas': (10,15), 'Grasas': (20,30)}
+        objetivos = settings.objetivos_macros
         max_attempts = 5
 
+        def porciones(posiciones):
+            return optimizar_porciones(
+                motor, posiciones, objetivos,
+                energia_kcal=settings.ENERGIA_PLATO_KCAL,
+                min_g=settings.PORCION_MIN_G, max_g=settings.PORCION_MAX_G,
+            )
+
         for i in range(1, n+1):
             print(f"\n--- Generando Plato {i} ---")
+            # El muestreo se repite en local hasta que exista un reparto de gramos balanceado
             for attempt in range(1, max_attempts+1):
-                protos = pick_affine_prototipos(cluster_map)
+                protos = muestrear()
                 if not protos:
                     print("[ERROR] No se generaron prototipos con afinidad. Abortando.")
                     return
-                print("Prototipos seleccionados:")
-                for p in protos:
-                    print(f" - {p['name']} (E{p['energy']} kcal, C{p['carbs']}g, P{p['protein']}g, F{p['fat']}g)")
-
-                data = ask_gemini_to_select(protos, max_retries=max_attempts)
-                if not data:
-                    continue
-
-                selection = [{'name': n, 'grams': g} for n, g in zip(data['ingredients'], data['weights_g'])]
-                totals = calcular_totales_gemini(df, selection)
-                pc = totals['Carbohidratos'] * 4 / totals['Calorías'] * 100
-                pp = totals['Proteínas'] * 4 / totals['Calorías'] * 100
-                pf = totals['Grasas'] * 9 / totals['Calorías'] * 100
-
-                if (
-                    objetivos['Carbohidratos'][0] <= pc <= objetivos['Carbohidratos'][1] and
-                    objetivos['Proteínas'][0]   <= pp <= objetivos['Proteínas'][1]   and
-                    objetivos['Grasas'][0]      <= pf <= objetivos['Grasas'][1]
-                ):
+                if porciones([indice.posicion(p['name']) for p in protos])['cumple']:
                     break
-                print("[WARN] No cumple objetivos nutricionales, reintentando...")
+                print("[WARN] Prototipos sin reparto balanceado posible, remuestreando...")
+            print("Prototipos seleccionados:")
+            for p in protos:
+                print(f" - {p['name']} (E{p['energy']} kcal, C{p['carbs']}g, P{p['protein']}g, F{p['fat']}g)")
+
+            # Gemini sólo nombra el plato y elige ingredientes; los gramos los pone el optimizador
+            try:
+                data = ask_gemini_to_select(protos, max_retries=max_attempts, indice=indice)
+            except gemini.GeminiNoDisponible as e:
+                print(f"[ERROR] {e}")
+                continue
+            if not data:
+                continue
+            opt = porciones([indice.posicion(nm) for nm in data['ingredients']])
+            selection = [{'name': nm, 'grams': g} for nm, g in zip(data['ingredients'], opt['weights_g'])]
+            totals = calcular_totales_gemini(motor, selection)
+            pc, pp, pf = (opt['porcentajes'][mac] for mac in ('Carbohidratos', 'Proteínas', 'Grasas'))
+            if not opt['cumple']:
+                print("[WARN] El plato elegido no cumple del todo los objetivos nutricionales.")
 
             # show final dish
             name = data.get('dish_name', 'Plato personalizado')
@@ -6,17 +6,66 @@ class Settings(BaseSettings):
     INGREDIENTES_CSV: str
     PLATOS_CSV: str
     GENAI_API_KEY: str
+    INGREDIENTES_CACHE_DIR: str | None = ".cache"  # Cache binaria (.npz) del CSV de ingredientes; None = sin cache
     MONGO_URI: str | None = None
+    MEMORIA_COMPARTIDA_DIR: str | None = None   # p. ej. /dev/shm/comedor: matriz compartida entre workers
 
     # --- Nuevas configuraciones para adaptar la lógica del test ---
     CLUSTERS: int = 4                           # Número de clusters para KMeans
+    CLUSTERS_MODEL_PATH: str | None = None      # Modelo KMeans persistido (joblib); None = sólo en memoria
+    CLUSTERS_MODO: str = "kmeans"               # kmeans (ajuste completo) | minibatch (partial_fit; filas nuevas sin reajustar)
+    CLUSTERS_LOTE: int = 4096                   # Filas por lote en modo minibatch
+    CLUSTERS_REAJUSTE_S: float | None = None    # Reajuste completo en segundo plano si hay filas asignadas; None = nunca (ignorado con MEMORIA_COMPARTIDA_DIR)
+    AFINIDAD: str = "vecinos"                   # vecinos (caminatas por el grafo kNN) | cluster (muestra del mayor cluster)
+    VECINOS_K: int = 15                         # Vecinos por ingrediente en el grafo de afinidad
+    VECINOS_SEMILLAS: int = 8                   # Semillas por plato en el cribado con grafo (menos = más variedad)
     PROTOTIPOS_MIN: int = 3                    # Mínimo ingredientes a muestrear
     PROTOTIPOS_MAX: int = 7                    # Máximo ingredientes a muestrear
+    CRIBADO_CANDIDATOS: int = 2000              # Subconjuntos evaluados antes de Gemini (0 = muestreo simple)
+    CRIBADO_TOP: int = 5                        # Mejores candidatos verificados con el optimizador
     GEMINI_MAX_RETRIES: int = 5                 # Reintentos al llamar a Gemini
+    GEMINI_BASE_URL: str | None = None          # Otro endpoint compatible (p. ej. http://127.0.0.1:8090 para pruebas)
+    GEMINI_TIMEOUT_S: float = 30                # Deadline de cada intento a Gemini
+    GEMINI_HEDGE_S: float | None = None         # Petición de respaldo pasado este tiempo (luego el p95); None = sin hedging
+    GEMINI_MAX_CONEXIONES: int = 16             # Conexiones keep-alive del cliente compartido
+    GEMINI_BACKOFF_BASE_S: float = 0.5          # Espera base entre reintentos (x2 por intento, con jitter)
+    GEMINI_BACKOFF_MAX_S: float = 8             # Tope de la espera entre reintentos
+    GEMINI_CIRCUITO_FALLOS: int = 5             # Fallos seguidos que abren el circuito
+    GEMINI_CIRCUITO_ENFRIAMIENTO_S: float = 30  # Tiempo abierto antes de una llamada de prueba
+    GEMINI_DEGRADAR: bool = True                # Con el circuito abierto: plato local genérico en vez de 503
+    GEMINI_RPS: float = 5                       # Llamadas/s sostenidas a Gemini por proceso (0 = sin límite)
+    GEMINI_RAFAGA: int = 10                     # Ráfaga máxima del token bucket
+    GEMINI_MAX_EN_VUELO: int = 16               # Llamadas simultáneas a Gemini por proceso
+    GEMINI_MAX_COLA: int = 64                   # Llamadas esperando turno; más allá se responde 429
+    GEMINI_CACHE_MAX: int = 10000               # Respuestas de Gemini en la LRU de memoria (0 = sin cache)
+    GEMINI_CACHE_TTL_S: float = 604800          # Vigencia de una respuesta cacheada (7 días)
+    GEMINI_CACHE_SQLITE: str | None = None      # p. ej. .cache/gemini.sqlite: nivel en disco que sobrevive reinicios
+    GEMINI_CONCURRENCIA: int = 4                # Platos generados en paralelo por request
+    GEMINI_BATCH: bool = False                  # Pedir todos los platos del menú en una sola llamada
+    POOL_PLATOS: int = 0                        # Platos validados pregenerados en memoria (0 = sin pool)
+    POOL_UMBRAL_RECARGA: int = 0                # Rellenar el pool al bajar a este nº de platos
+    POOL_CONCURRENCIA: int = 2                  # Platos que el productor genera a la vez
+    EJECUTOR: str = "hilos"                     # Etapas de CPU en: hilos | procesos | ninguno (en el event loop)
+    EJECUTOR_WORKERS: int | None = None         # Hilos o procesos del ejecutor; None = nº de CPUs
+    EJECUTOR_MAX_COLA: int = 64                 # Etapas esperando worker; más allá se responde 503
+    PRESUPUESTO_MENU_S: float | None = 20       # Latencia máxima de /menus/balanced; None = sin límite
     DEFAULT_DISHES_COUNT: int = 3              # Número por defecto de platos a generar
+    MAX_PLATOS: int = 20                        # Platos máximos por request (422 por encima)
     TARGET_CARBOHYDRATES: tuple[int, int] = (50, 60)  # % energía de carbohidratos
     TARGET_PROTEINS: tuple[int, int]     = (10, 15)  # % energía de proteínas
     TARGET_FATS: tuple[int, int]         = (20, 30)  # % energía de grasas
+    OPTIMIZAR_PORCIONES: bool = True            # Gramos calculados localmente en vez de los de Gemini
+    ENERGIA_PLATO_KCAL: int = 600               # Energía objetivo de un plato
+    PORCION_MIN_G: int = 10                     # Gramos mínimos por ingrediente
+    PORCION_MAX_G: int = 300                    # Gramos máximos por ingrediente
+
+    @property
+    def objetivos_macros(self):
+        return {
+            'Carbohidratos': self.TARGET_CARBOHYDRATES,
+            'Proteínas': self.TARGET_PROTEINS,
+            'Grasas': self.TARGET_FATS,
+        }
 
     model_config = ConfigDict(
         env_file = ".env",
@@ -0,0 +1,98 @@
+import os
+
+import numpy as np
+
+from app.nutricion import MACROS
+
+VERSION_GRAFO = 1
+
+
+# --- Grafo kNN de afinidad: k vecinos más cercanos de cada ingrediente como arrays int32 ---
+class GrafoVecinos:
+    def __init__(self, vecinos):
+        self.vecinos = vecinos               # (n, k) int32: posiciones en la matriz, sin la propia fila
+
+    def __len__(self):
+        return len(self.vecinos)
+
+    @property
+    def k(self):
+        return self.vecinos.shape[1]
+
+    @classmethod
+    def construir(cls, motor, k=15, lote=65536):
+        from sklearn.neighbors import KDTree
+
+        # Perfil de macros (energía + C/P/G) escalado min-max: un KD-tree en 4 dimensiones sigue
+        # siendo O(n log n), con los 17 nutrientes la búsqueda exacta degenera a fuerza bruta
+        cols = [motor.columna(c) for c in MACROS.values()]
+        if any(j is None for j in cols):
+            raise KeyError("Faltan columnas de energía o macronutrientes en la BD.")
+        X = motor.matriz[:, cols].astype(np.float64)
+        rango = np.ptp(X, axis=0)
+        X = (X - X.min(axis=0)) / np.where(rango > 0, rango, 1)
+
+        n = len(X)
+        k = min(k, n - 1)
+        vecinos = np.empty((n, max(k, 0)), dtype=np.int32)
+        if k <= 0:
+            return cls(vecinos)
+        arbol = KDTree(X)
+        for i in range(0, n, lote):
+            ind = arbol.query(X[i:i + lote], k=k + 1, return_distance=False)
+            # Con filas duplicadas la propia fila puede no salir primera: se quita donde esté
+            propia = ind == np.arange(i, i + len(ind))[:, None]
+            propia[~propia.any(axis=1), -1] = True
+            vecinos[i:i + len(ind)] = ind[~propia].reshape(len(ind), k)
+        return cls(vecinos)
+
+    def caminatas(self, n, largo, rng=None, semillas=None, reintentos=3):
+        # n caminatas de `largo` nodos desde semillas al azar (o dadas): cada paso salta a un vecino
+        # de un nodo ya visitado, así el conjunto se queda cerca de la semilla sin ser una copia del cluster
+        rng = rng or np.random.default_rng()
+        idx = np.empty((n, largo), dtype=np.int32)
+        idx[:, 0] = rng.integers(0, len(self), n) if semillas is None else semillas
+        if self.k == 0:
+            idx[:, 1:] = idx[:, :1]
+            return idx
+        filas = np.arange(n)
+        for j in range(1, largo):
+            origen = idx[filas, rng.integers(0, j, n)]
+            idx[:, j] = self.vecinos[origen, rng.integers(0, self.k, n)]
+            # Los saltos a nodos ya visitados se repiten unas pocas veces (las repeticiones que queden
+            # las descarta el cribado)
+            for _ in range(reintentos):
+                repetidas = np.flatnonzero((idx[:, :j] == idx[:, j:j + 1]).any(axis=1))
+                if not len(repetidas):
+                    break
+                origen = idx[repetidas, rng.integers(0, j, len(repetidas))]
+                idx[repetidas, j] = self.vecinos[origen, rng.integers(0, self.k, len(repetidas))]
+        return idx
+
+
+def ruta_grafo(cache_dir, huella, k):
+    return os.path.join(cache_dir, f"vecinos-{huella[:16]}-k{k}-v{VERSION_GRAFO}.npy")
+
+
+def cargar_grafo(almacen, motor, k=15, cache_dir=None):
+    # Se construye una vez por versión del CSV; con cache, el resto de procesos lo mapea de disco
+    ruta = ruta_grafo(cache_dir, almacen.huella, k) if cache_dir else None
+    if ruta and os.path.exists(ruta):
+        try:
+            vecinos = np.load(ruta, mmap_mode='r', allow_pickle=False)
+            if vecinos.dtype == np.int32 and len(vecinos) == len(almacen):
+                return GrafoVecinos(vecinos)
+        except (OSError, ValueError) as e:
+            print(f"[WARN] Grafo de vecinos inválido ({ruta}): {e}")
+
+    print(f"[INFO] Construyendo grafo kNN (k={k}) sobre {len(almacen)} ingredientes...")
+    grafo = GrafoVecinos.construir(motor, k)
+    if ruta:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp = f"{ruta}.{os.getpid()}.tmp.npy"
+            np.save(tmp, grafo.vecinos)
+            os.replace(tmp, ruta)
+        except OSError as e:
+            print(f"[WARN] No se pudo escribir la cache del grafo de vecinos: {e}")
+    return grafo
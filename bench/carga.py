@@ -0,0 +1,177 @@
+"""Prueba de carga de la API con concurrencia creciente.
+
+Mide throughput y latencias p50/p95/p99 de /menus/balanced, /menus/complete y
+/orders. Con ``--lanzar`` arranca un Gemini falso (bench/fake_gemini.py) y la
+API con uvicorn apuntando a él, sin tocar la red ni gastar cuota.
+
+Uso:
+    python bench/carga.py --lanzar [--workers 2] [--concurrencias 1,4,16,64] [--duracion 10]
+                          [--latencia lognormal:0.8:0.5] [--errores 0.02] [--malformado 0.05]
+    python bench/carga.py --url http://127.0.0.1:8000      # contra una API ya levantada
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from bench.datos_sinteticos import escribir  # noqa: E402
+
+ENDPOINTS = {
+    'balanced': ('/menus/balanced', lambda n: {'n_platos': n}),
+    'complete': ('/menus/complete', lambda n: {'n_platos': n}),
+    'orders': ('/orders', lambda n: {
+        'menu_id': 'carga',
+        'items': [{'name': 'Arroz', 'energy': 115, 'carbs': 25, 'protein': 2.4, 'fat': 0.1, 'grams': 150}],
+        'user_id': None,
+    }),
+}
+
+
+async def _trabajador(cliente, ruta, cuerpo, fin, muestras):
+    while time.perf_counter() < fin:
+        t = time.perf_counter()
+        try:
+            r = await cliente.post(ruta, json=cuerpo)
+            status = r.status_code
+        except Exception as e:
+            status = type(e).__name__
+        muestras.append((time.perf_counter() - t, status))
+
+
+async def nivel(url, ruta, cuerpo, concurrencia, duracion, timeout):
+    import httpx
+
+    muestras = []
+    limites = httpx.Limits(max_connections=concurrencia, max_keepalive_connections=concurrencia)
+    async with httpx.AsyncClient(base_url=url, timeout=timeout, limits=limites) as cliente:
+        inicio = time.perf_counter()
+        fin = inicio + duracion
+        await asyncio.gather(*(_trabajador(cliente, ruta, cuerpo, fin, muestras) for _ in range(concurrencia)))
+        transcurrido = time.perf_counter() - inicio
+    return resumen(muestras, transcurrido, concurrencia)
+
+
+def resumen(muestras, transcurrido, concurrencia):
+    estados = {}
+    for _, status in muestras:
+        estados[str(status)] = estados.get(str(status), 0) + 1
+    ok = np.array([lat for lat, status in muestras if status == 200])
+    p50, p95, p99 = (np.percentile(ok, [50, 95, 99]) * 1000).tolist() if len(ok) else (None, None, None)
+    return {
+        'concurrencia': concurrencia,
+        'peticiones': len(muestras),
+        'ok': int(len(ok)),
+        'throughput_rps': len(ok) / transcurrido,
+        'error_pct': 100 * (1 - len(ok) / len(muestras)) if muestras else 0.0,
+        'p50_ms': p50, 'p95_ms': p95, 'p99_ms': p99,
+        'estados': estados,
+    }
+
+
+def _fmt(v):
+    return f"{v:9.1f}" if v is not None else f"{'-':>9}"
+
+
+def imprimir(endpoint, r):
+    print(f"{endpoint:<9} c={r['concurrencia']:<4} {r['throughput_rps']:8.2f} req/s  "
+          f"p50 {_fmt(r['p50_ms'])} ms  p95 {_fmt(r['p95_ms'])} ms  p99 {_fmt(r['p99_ms'])} ms  "
+          f"err {r['error_pct']:5.1f}%  {r['estados']}", flush=True)
+
+
+def _esperar(url, proceso, limite_s=120):
+    import httpx
+
+    fin = time.time() + limite_s
+    while time.time() < fin:
+        if proceso.poll() is not None:
+            raise SystemExit(f"[ERROR] El proceso terminó antes de estar listo ({url})")
+        try:
+            if httpx.get(url, timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise SystemExit(f"[ERROR] {url} no respondió en {limite_s}s")
+
+
+def lanzar(args):
+    # Gemini falso + API con uvicorn (varios workers si se pide) apuntando a él
+    procesos = []
+    falso = subprocess.Popen([
+        sys.executable, os.path.join(RAIZ, 'bench', 'fake_gemini.py'), '--puerto', str(args.puerto_gemini),
+        '--latencia', args.latencia, '--errores', str(args.errores), '--malformado', str(args.malformado),
+    ], cwd=RAIZ)
+    procesos.append(falso)
+    _esperar(f"http://127.0.0.1:{args.puerto_gemini}/estadisticas", falso)
+
+    env = dict(os.environ)
+    env['GEMINI_BASE_URL'] = f"http://127.0.0.1:{args.puerto_gemini}"
+    env.setdefault('GENAI_API_KEY', 'carga')
+    env.setdefault('INGREDIENTES_CSV', os.path.join(RAIZ, 'test', 'ingredientes.csv'))
+    if 'PLATOS_CSV' not in env:
+        env['PLATOS_CSV'] = escribir(1000, os.path.join(RAIZ, '.cache', 'bench'))[1]
+    if args.sin_cache:
+        env['GEMINI_CACHE_MAX'] = '0'
+    api = subprocess.Popen([
+        sys.executable, '-m', 'uvicorn', 'app.main:app', '--port', str(args.puerto_api),
+        '--workers', str(args.workers), '--log-level', 'warning', '--no-access-log',
+    ], cwd=RAIZ, env=env)
+    procesos.append(api)
+    _esperar(f"http://127.0.0.1:{args.puerto_api}/ready", api)
+    return procesos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default=None, help="API ya levantada (por defecto la lanzada con --lanzar)")
+    parser.add_argument('--endpoints', default=','.join(ENDPOINTS))
+    parser.add_argument('--concurrencias', default='1,2,4,8,16,32')
+    parser.add_argument('--duracion', type=float, default=10, help="segundos por nivel de concurrencia")
+    parser.add_argument('--n-platos', type=int, default=3)
+    parser.add_argument('--timeout', type=float, default=60)
+    parser.add_argument('--salida', help="JSON con los resultados")
+    parser.add_argument('--lanzar', action='store_true', help="arrancar Gemini falso + API")
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--puerto-api', type=int, default=8000)
+    parser.add_argument('--puerto-gemini', type=int, default=8090)
+    parser.add_argument('--latencia', default='lognormal:0.8:0.5', help="ver bench/fake_gemini.py")
+    parser.add_argument('--errores', type=float, default=0.0)
+    parser.add_argument('--malformado', type=float, default=0.0)
+    parser.add_argument('--sin-cache', action='store_true', help="GEMINI_CACHE_MAX=0 en la API lanzada")
+    args = parser.parse_args()
+
+    procesos = lanzar(args) if args.lanzar else []
+    url = args.url or f"http://127.0.0.1:{args.puerto_api}"
+    resultados = {'url': url, 'args': vars(args), 'niveles': {}}
+    try:
+        for endpoint in args.endpoints.split(','):
+            ruta, cuerpo = ENDPOINTS[endpoint]
+            resultados['niveles'][endpoint] = []
+            for c in (int(x) for x in args.concurrencias.split(',')):
+                r = asyncio.run(nivel(url, ruta, cuerpo(args.n_platos), c, args.duracion, args.timeout))
+                resultados['niveles'][endpoint].append(r)
+                imprimir(endpoint, r)
+    finally:
+        for p in reversed(procesos):
+            p.terminate()
+            try:
+                p.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                p.kill()
+
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            json.dump(resultados, f, ensure_ascii=False, indent=2)
+        print(f"[INFO] Resultados en {args.salida}")
+
+
+if __name__ == "__main__":
+    main()
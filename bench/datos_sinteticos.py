@@ -0,0 +1,112 @@
+"""Tablas sintéticas de ingredientes y platos con el esquema real de los CSV.
+
+Uso:
+    python bench/datos_sinteticos.py 10000 --dir /tmp/bench
+"""
+import argparse
+import os
+
+import numpy as np
+
+# Cabecera de test/ingredientes.csv (mismo orden y nombres)
+COLUMNAS_INGREDIENTES = [
+    'CODIGO', 'NOMBRE DEL ALIMENTO', 'Energía (kcal)', 'Agua (g)', 'Proteínas totales (g)', 'Grasa total (g)',
+    'Carbohidratos disponibles (g)', 'Fibra dietaria (g)', 'Calcio (mg)', 'Fósforo (mg)', 'Zinc (mg)',
+    'Hierro (mg)', 'Vitamina A equivalentes totales (µg)', 'Tiamina (mg)', 'Riboflavina (mg)', 'Niacina (mg)',
+    'Vitamina C (mg)', 'Sodio (mg)', 'Potasio (mg)',
+]
+COLUMNAS_PLATOS = [
+    'NOMBRE DEL ALIMENTO', 'Energía (kcal)', 'Carbohidratos disponibles (g)', 'Proteínas totales (g)',
+    'Grasa total (g)',
+]
+
+BASES = [
+    'Arroz', 'Papa', 'Pollo', 'Pescado', 'Quinua', 'Maíz', 'Frejol', 'Camote', 'Yuca', 'Res', 'Cerdo',
+    'Lenteja', 'Habas', 'Olluco', 'Zapallo', 'Tomate', 'Cebolla', 'Ají', 'Queso', 'Leche', 'Choclo', 'Trucha',
+]
+PREPARACIONES = ['cocido', 'frito', 'sancochado', 'al horno', 'guisado', 'crudo', 'seco', 'en conserva']
+# Micronutrientes: (media log-normal, fracción de celdas vacías como en la tabla real)
+MICROS = {
+    'Fibra dietaria (g)': (1.0, 0.2), 'Calcio (mg)': (3.5, 0.05), 'Fósforo (mg)': (4.5, 0.05),
+    'Zinc (mg)': (0.0, 0.1), 'Hierro (mg)': (0.3, 0.05), 'Vitamina A equivalentes totales (µg)': (2.5, 0.15),
+    'Tiamina (mg)': (-2.5, 0.1), 'Riboflavina (mg)': (-2.3, 0.1), 'Niacina (mg)': (0.5, 0.1),
+    'Vitamina C (mg)': (1.0, 0.15), 'Sodio (mg)': (4.0, 0.3), 'Potasio (mg)': (5.0, 0.3),
+}
+
+
+def _nombres(n, rng, prefijo=''):
+    # Únicos y con vocabulario compartido (realista para el índice de trigramas)
+    bases = np.array(BASES)[rng.integers(0, len(BASES), n)]
+    preps = np.array(PREPARACIONES)[rng.integers(0, len(PREPARACIONES), n)]
+    return [f"{prefijo}{b} {p} variedad {i:07d}" for i, (b, p) in enumerate(zip(bases.tolist(), preps.tolist()))]
+
+
+def _macros(n, rng):
+    # Gramos de proteína, grasa y carbohidratos por 100 g (suman <= 100) y energía coherente
+    partes = rng.dirichlet((1.0, 0.8, 1.5, 2.0), n) * 100
+    P, F, C = partes[:, 0], partes[:, 1], partes[:, 2]
+    E = np.rint(4 * P + 9 * F + 4 * C + rng.normal(0, 5, n)).clip(0)
+    return E, np.round(P, 1), np.round(F, 1), np.round(C, 1)
+
+
+def tabla_ingredientes(n, seed=0):
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    E, P, F, C = _macros(n, rng)
+    datos = {
+        'CODIGO': [f"S{i}" for i in range(n)],
+        'NOMBRE DEL ALIMENTO': _nombres(n, rng),
+        'Energía (kcal)': E,
+        'Agua (g)': np.round(rng.uniform(0, 95, n), 1),
+        'Proteínas totales (g)': P,
+        'Grasa total (g)': F,
+        'Carbohidratos disponibles (g)': C,
+    }
+    for col, (media, vacias) in MICROS.items():
+        valores = np.round(rng.lognormal(media, 1.0, n), 2)
+        valores[rng.random(n) < vacias] = np.nan
+        datos[col] = valores
+    return pd.DataFrame(datos, columns=COLUMNAS_INGREDIENTES)
+
+
+def tabla_platos(n, seed=1):
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    E, P, F, C = _macros(n, rng)
+    return pd.DataFrame({
+        'NOMBRE DEL ALIMENTO': _nombres(n, rng, prefijo='Plato de '),
+        'Energía (kcal)': E,
+        'Carbohidratos disponibles (g)': C,
+        'Proteínas totales (g)': P,
+        'Grasa total (g)': F,
+    }, columns=COLUMNAS_PLATOS)
+
+
+def escribir(n, directorio, seed=0):
+    # Reutiliza los CSV si ya existen para este tamaño y semilla
+    os.makedirs(directorio, exist_ok=True)
+    ingredientes = os.path.join(directorio, f"ingredientes-{n}-s{seed}.csv")
+    platos = os.path.join(directorio, f"platos-{n}-s{seed}.csv")
+    if not os.path.exists(ingredientes):
+        tabla_ingredientes(n, seed).to_csv(ingredientes + '.tmp', index=False)
+        os.replace(ingredientes + '.tmp', ingredientes)
+    if not os.path.exists(platos):
+        tabla_platos(n, seed + 1).to_csv(platos + '.tmp', index=False)
+        os.replace(platos + '.tmp', platos)
+    return ingredientes, platos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('filas', type=int)
+    parser.add_argument('--dir', default='.cache/bench')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    for ruta in escribir(args.filas, args.dir, args.seed):
+        print(ruta)
+
+
+if __name__ == "__main__":
+    main()
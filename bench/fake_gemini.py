@@ -0,0 +1,120 @@
+"""Servidor local que imita la API REST de Gemini (generateContent) para pruebas de carga.
+
+Responde platos válidos con los ingredientes del prompt, con latencia, tasa de
+errores HTTP y tasa de JSON malformado configurables. La API apunta a él con
+``GEMINI_BASE_URL=http://127.0.0.1:8090``.
+
+Uso:
+    python bench/fake_gemini.py [--puerto 8090] [--latencia lognormal:0.8:0.5]
+                                [--errores 0.02] [--malformado 0.05]
+"""
+import argparse
+import asyncio
+import json
+
+import numpy as np
+
+DISTRIBUCIONES = ('fija', 'uniforme', 'exponencial', 'lognormal')
+# JSON cortado, texto libre y objeto vacío (la API los rechaza en la validación)
+MALFORMADOS = ('```json\n{"dish_name": "Plato roto", "ingredients": [', 'Lo siento, no puedo.', '{}')
+
+
+def parsear_latencia(spec):
+    # 'fija:0.5' | 'uniforme:0.2:1.5' | 'exponencial:0.8' | 'lognormal:<mediana>:<sigma>' (segundos)
+    nombre, *params = spec.split(':')
+    if nombre not in DISTRIBUCIONES:
+        raise argparse.ArgumentTypeError(f"distribución desconocida {nombre!r}; opciones: {', '.join(DISTRIBUCIONES)}")
+    return nombre, [float(p) for p in params]
+
+
+def muestrear_latencia(rng, nombre, params):
+    if nombre == 'fija':
+        return params[0]
+    if nombre == 'uniforme':
+        return rng.uniform(params[0], params[1])
+    if nombre == 'exponencial':
+        return rng.exponential(params[0])
+    mediana, sigma = params
+    return rng.lognormal(np.log(mediana), sigma)
+
+
+def _prototipos(prompt):
+    # El JSON de ingredientes va entre la primera línea del prompt y "Responde ÚNICAMENTE..."
+    inicio = prompt.index(':\n') + 2
+    return json.loads(prompt[inicio:prompt.index('\nResponde', inicio)])
+
+
+def _plato(nombres, rng):
+    nombres = nombres[:7]
+    return {
+        'dish_name': f"Plato de prueba {rng.integers(1, 10**6)}",
+        'ingredients': nombres,
+        'weights_g': [int(g) for g in rng.integers(20, 250, len(nombres))],
+    }
+
+
+def respuesta(prompt, rng):
+    datos = _prototipos(prompt)
+    if datos and isinstance(datos[0], dict) and 'index' in datos[0]:
+        # Modo lote: un plato por grupo
+        return {'dishes': [
+            {'index': g['index'], **_plato([p['name'] for p in g['ingredients']], rng)} for g in datos
+        ]}
+    return _plato([p['name'] for p in datos], rng)
+
+
+def crear_app(latencia, errores, malformado, seed=None):
+    from fastapi import FastAPI, Request
+    from fastapi.responses import JSONResponse
+
+    app = FastAPI(title="Gemini falso")
+    rng = np.random.default_rng(seed)
+    contadores = {'peticiones': 0, 'errores': 0, 'malformados': 0}
+
+    @app.post("/{version}/models/{accion}")
+    async def generate_content(version: str, accion: str, request: Request):
+        contadores['peticiones'] += 1
+        cuerpo = await request.json()
+        await asyncio.sleep(muestrear_latencia(rng, *latencia))
+
+        if rng.random() < errores:
+            contadores['errores'] += 1
+            codigo = int(rng.choice((429, 500, 503)))
+            return JSONResponse({'error': {'code': codigo, 'message': 'Error simulado', 'status': 'UNAVAILABLE'}},
+                                status_code=codigo)
+
+        prompt = ''.join(p.get('text', '') for c in cuerpo.get('contents', []) for p in c.get('parts', []))
+        if rng.random() < malformado:
+            contadores['malformados'] += 1
+            texto = str(rng.choice(MALFORMADOS))
+        else:
+            texto = '```json\n' + json.dumps(respuesta(prompt, rng), ensure_ascii=False) + '\n```'
+        return {
+            'candidates': [{'content': {'role': 'model', 'parts': [{'text': texto}]}, 'finishReason': 'STOP'}],
+            'usageMetadata': {'promptTokenCount': len(prompt) // 4, 'candidatesTokenCount': len(texto) // 4},
+        }
+
+    @app.get("/estadisticas")
+    async def estadisticas():
+        return contadores
+
+    return app
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--puerto', type=int, default=8090)
+    parser.add_argument('--latencia', type=parsear_latencia, default='lognormal:0.8:0.5',
+                        help="fija:S | uniforme:MIN:MAX | exponencial:MEDIA | lognormal:MEDIANA:SIGMA")
+    parser.add_argument('--errores', type=float, default=0.0, help="fracción de respuestas 429/500/503")
+    parser.add_argument('--malformado', type=float, default=0.0, help="fracción de respuestas con JSON inválido")
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+    uvicorn.run(crear_app(args.latencia, args.errores, args.malformado, args.seed),
+                host='127.0.0.1', port=args.puerto, log_level='warning')
+
+
+if __name__ == "__main__":
+    main()
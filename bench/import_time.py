@@ -0,0 +1,88 @@
+"""Benchmark del tiempo de importación de app.main.
+
+Importa la app en procesos nuevos (sin caches de módulos) y falla si la
+mediana supera el presupuesto. También lista los módulos más lentos según
+``python -X importtime``.
+
+Uso:
+    python bench/import_time.py [--presupuesto 0.8] [--repeticiones 5]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Módulos que no deben cargarse al importar la app (se importan al primer uso)
+PESADOS = ('pandas', 'sklearn', 'scipy', 'google.genai')
+
+CODIGO = (
+    "import sys, time\n"
+    "t = time.perf_counter()\n"
+    "import app.main\n"
+    "print(time.perf_counter() - t)\n"
+    f"print(','.join(m for m in {PESADOS!r} if m in sys.modules))\n"
+)
+
+
+def _entorno():
+    env = dict(os.environ)
+    # Settings() exige estas variables; para importar basta con valores de relleno
+    env.setdefault('INGREDIENTES_CSV', os.path.join(RAIZ, 'test', 'ingredientes.csv'))
+    env.setdefault('PLATOS_CSV', os.path.join(RAIZ, 'test', 'platos.csv'))
+    env.setdefault('GENAI_API_KEY', 'benchmark')
+    return env
+
+
+def medir(repeticiones):
+    tiempos, pesados = [], set()
+    for _ in range(repeticiones):
+        out = subprocess.run(
+            [sys.executable, '-c', CODIGO], cwd=RAIZ, env=_entorno(),
+            capture_output=True, text=True, check=True,
+        ).stdout.split('\n')
+        tiempos.append(float(out[0]))
+        pesados.update(m for m in out[1].split(',') if m)
+    return tiempos, sorted(pesados)
+
+
+def top_importtime(n=10):
+    err = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import app.main'], cwd=RAIZ, env=_entorno(),
+        capture_output=True, text=True, check=True,
+    ).stderr
+    filas = []
+    for linea in err.splitlines():
+        if not linea.startswith('import time:') or 'cumulative' in linea:
+            continue
+        _, acumulado, modulo = linea[len('import time:'):].split('|')
+        filas.append((int(acumulado), modulo.strip()))
+    return sorted(filas, reverse=True)[:n]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--presupuesto', type=float, default=0.8, help="segundos (mediana) permitidos")
+    parser.add_argument('--repeticiones', type=int, default=5)
+    args = parser.parse_args()
+
+    tiempos, pesados = medir(args.repeticiones)
+    mediana = statistics.median(tiempos)
+    print(f"import app.main: mediana {mediana:.3f}s (min {min(tiempos):.3f}s, max {max(tiempos):.3f}s)")
+    print("Módulos con mayor tiempo acumulado:")
+    for us, modulo in top_importtime():
+        print(f"  {us / 1e6:7.3f}s  {modulo}")
+
+    fallos = []
+    if mediana > args.presupuesto:
+        fallos.append(f"la mediana {mediana:.3f}s supera el presupuesto de {args.presupuesto:.3f}s")
+    if pesados:
+        fallos.append(f"módulos pesados importados al arrancar: {', '.join(pesados)}")
+    for f in fallos:
+        print(f"[ERROR] {f}")
+    sys.exit(1 if fallos else 0)
+
+
+if __name__ == "__main__":
+    main()
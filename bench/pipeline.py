@@ -0,0 +1,236 @@
+"""Benchmark del pipeline de procesamiento sobre tablas sintéticas.
+
+Genera CSV de ingredientes y platos con el esquema real (bench/datos_sinteticos.py),
+mide las funciones del pipeline por tamaño de tabla y su pico de memoria
+(tracemalloc), y guarda el resultado en JSON. Con ``--comparar`` se contrasta
+con un JSON anterior y falla si algún tiempo mínimo (más estable que la
+mediana) empeora más de la tolerancia.
+
+Uso:
+    python bench/pipeline.py [--tamanos 1000,10000,100000,1000000] [--salida res.json]
+                             [--comparar base.json] [--tolerancia 0.25]
+"""
+import argparse
+import functools
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+# Settings() exige estas variables; el benchmark no llama a Gemini
+os.environ.setdefault('INGREDIENTES_CSV', os.path.join(RAIZ, 'test', 'ingredientes.csv'))
+os.environ.setdefault('PLATOS_CSV', os.path.join(RAIZ, 'test', 'platos.csv'))
+os.environ.setdefault('GENAI_API_KEY', 'benchmark')
+
+import numpy as np  # noqa: E402
+
+from bench.datos_sinteticos import escribir  # noqa: E402
+
+TAMANOS = (1_000, 10_000, 100_000, 1_000_000)
+# Por debajo de este tiempo base las diferencias son ruido y no cuentan como regresión
+MIN_BASE_S = 0.005
+
+
+def medir(fn, repeticiones=3, preparar=None, llamadas=1, memoria=True):
+    # preparar() -> argumentos de fn, fuera del tiempo medido; llamadas > 1 promedia funciones muy rápidas
+    tiempos = []
+    for _ in range(repeticiones):
+        args = preparar() if preparar else ()
+        gc.collect()
+        t = time.perf_counter()
+        for _ in range(llamadas):
+            fn(*args)
+        tiempos.append((time.perf_counter() - t) / llamadas)
+    res = {
+        'mediana_s': statistics.median(tiempos),
+        'min_s': min(tiempos),
+        'max_s': max(tiempos),
+        'repeticiones': repeticiones,
+        'llamadas': llamadas,
+    }
+    if memoria:
+        args = preparar() if preparar else ()
+        gc.collect()
+        tracemalloc.start()
+        fn(*args)
+        res['pico_mem_mb'] = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+    return res
+
+
+def bench_tamano(n, directorio, repeticiones, memoria):
+    from app import procesamiento as proc
+    from app.almacen import cargar_almacen
+    from app.cribado import cuotas_energia, pick_prototipos_cribados
+    from app.nutricion import MotorNutricional
+    from app.vecinos import GrafoVecinos
+    from app.settings import settings
+
+    ingredientes, platos = escribir(n, directorio)
+    rng = np.random.default_rng(0)
+    res = {}
+
+    def paso(nombre, *args, **kwargs):
+        print(f"[INFO] n={n}: {nombre}...", flush=True)
+        res[nombre] = medir(*args, repeticiones=repeticiones, memoria=memoria, **kwargs)
+        r = res[nombre]
+        print(f"[INFO] n={n}: {nombre} mediana {r['mediana_s'] * 1000:.3f} ms"
+              + (f", pico {r['pico_mem_mb']:.1f} MB" if 'pico_mem_mb' in r else ''), flush=True)
+
+    paso('cargar_ingredientes', proc.cargar_ingredientes, preparar=lambda: (ingredientes,))
+    df, cols, indice = proc.cargar_ingredientes(ingredientes)
+
+    paso('cluster_ingredientes', proc.cluster_ingredientes, preparar=lambda: (df, cols, settings.CLUSTERS))
+    paso(
+        'cluster_ingredientes_minibatch', proc.cluster_ingredientes,
+        preparar=lambda: (df, cols, settings.CLUSTERS, 'minibatch', settings.CLUSTERS_LOTE),
+    )
+    cluster_map, _ = proc.cluster_ingredientes(df, cols, settings.CLUSTERS)
+
+    paso('pick_affine_prototipos', proc.pick_affine_prototipos, preparar=lambda: (cluster_map,), llamadas=50)
+
+    motor = MotorNutricional.desde_df(df, cols, indice)
+    nombres = indice.nombres
+
+    def seleccion():
+        pos = rng.choice(len(nombres), size=5, replace=False)
+        return (motor, [{'name': nombres[p], 'grams': 100.0} for p in pos])
+
+    paso('calcular_totales_gemini', proc.calcular_totales_gemini, preparar=seleccion, llamadas=200)
+
+    # Modo lote (GEMINI_BATCH): 10 platos plato a plato frente a totales_lote, con nombres y con
+    # posiciones ya resueltas (como en etapas.armar_platos)
+    def lote():
+        selecciones = [seleccion()[1] for _ in range(10)]
+        posiciones = [[indice.posicion(s['name']) for s in sel] for sel in selecciones]
+        return (motor, selecciones, posiciones)
+
+    def totales_por_plato(motor, selecciones, _posiciones):
+        return [motor.totales(s) for s in selecciones]
+
+    def totales_lote_nombres(motor, selecciones, _posiciones):
+        return motor.totales_lote(selecciones)
+
+    paso('totales_10_platos', totales_por_plato, preparar=lote, llamadas=50)
+    paso('totales_lote_10_platos', totales_lote_nombres, preparar=lote, llamadas=50)
+    paso('totales_lote_10_platos_posiciones', MotorNutricional.totales_lote, preparar=lote, llamadas=50)
+
+    def catalogo_frio():
+        proc._catalogos.pop(platos, None)
+        return (platos, 3)
+
+    paso('generar_platos_completos_frio', proc.generar_platos_completos, preparar=catalogo_frio)
+    paso('generar_platos_completos', proc.generar_platos_completos, preparar=lambda: (platos, 3), llamadas=200)
+
+    # Ruta de la API: almacén compacto desde la cache .npz y cribado vectorizado
+    cache_dir = os.path.join(directorio, 'cache')
+    cargar_almacen(ingredientes, cache_dir)
+    paso('cargar_almacen_cache', cargar_almacen, preparar=lambda: (ingredientes, cache_dir))
+    motor_alm = MotorNutricional.desde_almacen(cargar_almacen(ingredientes, cache_dir))
+    cuotas = cuotas_energia(motor_alm)
+    mayor = max(cluster_map.values(), key=len).index.to_numpy()
+    paso(
+        'pick_prototipos_cribados', pick_prototipos_cribados,
+        preparar=lambda: (motor_alm, cuotas, mayor, settings.objetivos_macros, settings.CRIBADO_CANDIDATOS),
+        llamadas=10,
+    )
+
+    # Afinidad por grafo kNN: construcción (una vez por versión del CSV) y cribado por caminatas
+    paso('construir_grafo_vecinos', GrafoVecinos.construir, preparar=lambda: (motor_alm, settings.VECINOS_K))
+    grafo = GrafoVecinos.construir(motor_alm, settings.VECINOS_K)
+    paso(
+        'pick_prototipos_cribados_vecinos',
+        functools.partial(pick_prototipos_cribados, grafo=grafo, n_semillas=settings.VECINOS_SEMILLAS),
+        preparar=lambda: (motor_alm, cuotas, None, settings.objetivos_macros, settings.CRIBADO_CANDIDATOS),
+        llamadas=10,
+    )
+    return res
+
+
+def _version(modulo):
+    try:
+        return __import__(modulo).__version__
+    except Exception:
+        return None
+
+
+def metadatos():
+    def git(*args):
+        try:
+            return subprocess.run(['git', *args], cwd=RAIZ, capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    return {
+        'commit': git('rev-parse', '--short', 'HEAD'),
+        'cambios_sin_commit': bool(git('status', '--porcelain', '--untracked-files=no')),
+        'fecha': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'cpus': os.cpu_count(),
+        'versiones': {m: _version(m) for m in ('numpy', 'pandas', 'sklearn', 'scipy')},
+    }
+
+
+def comparar(actual, base, tolerancia):
+    regresiones = []
+    print(f"{'n':>9}  {'función':<32} {'base ms':>10} {'actual ms':>10} {'ratio':>7}")
+    for n, funciones in actual['resultados'].items():
+        for nombre, r in funciones.items():
+            b = base.get('resultados', {}).get(n, {}).get(nombre)
+            if not b:
+                continue
+            ratio = r['min_s'] / b['min_s'] if b['min_s'] else float('inf')
+            marca = ''
+            if ratio > 1 + tolerancia and b['min_s'] >= MIN_BASE_S:
+                regresiones.append((n, nombre, ratio))
+                marca = '  <-- regresión'
+            print(f"{n:>9}  {nombre:<32} {b['min_s'] * 1000:10.3f} {r['min_s'] * 1000:10.3f} {ratio:7.2f}{marca}")
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tamanos', default=','.join(map(str, TAMANOS)), help="filas, separadas por comas")
+    parser.add_argument('--repeticiones', type=int, default=3, help="por función (1 a partir de 1M filas)")
+    parser.add_argument('--dir', default=os.path.join(RAIZ, '.cache', 'bench'), help="CSV sintéticos y caches")
+    parser.add_argument('--salida', help="JSON de resultados (por defecto bench/resultados/pipeline-<commit>.json)")
+    parser.add_argument('--sin-memoria', action='store_true', help="no medir picos con tracemalloc")
+    parser.add_argument('--comparar', help="JSON de una ejecución anterior")
+    parser.add_argument('--tolerancia', type=float, default=0.25, help="empeoramiento relativo permitido")
+    args = parser.parse_args()
+
+    resultado = {'meta': metadatos(), 'resultados': {}}
+    for n in (int(t) for t in args.tamanos.split(',')):
+        repeticiones = args.repeticiones if n < 1_000_000 else 1
+        resultado['resultados'][str(n)] = bench_tamano(n, args.dir, repeticiones, not args.sin_memoria)
+        gc.collect()
+
+    salida = args.salida or os.path.join(
+        RAIZ, 'bench', 'resultados', f"pipeline-{resultado['meta']['commit'] or 'sin-git'}.json",
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(salida)), exist_ok=True)
+    with open(salida, 'w', encoding='utf-8') as f:
+        json.dump(resultado, f, ensure_ascii=False, indent=2)
+    print(f"[INFO] Resultados en {salida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            base = json.load(f)
+        regresiones = comparar(resultado, base, args.tolerancia)
+        for n, nombre, ratio in regresiones:
+            print(f"[ERROR] n={n} {nombre}: {ratio:.2f}x más lento que la base")
+        sys.exit(1 if regresiones else 0)
+
+
+if __name__ == "__main__":
+    main()
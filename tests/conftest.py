@@ -0,0 +1,10 @@
+import os
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+# Settings() exige estas variables; las pruebas no llaman a Gemini ni leen los CSV
+os.environ.setdefault('INGREDIENTES_CSV', os.path.join(RAIZ, 'test', 'ingredientes.csv'))
+os.environ.setdefault('PLATOS_CSV', os.path.join(RAIZ, 'test', 'platos.csv'))
+os.environ.setdefault('GENAI_API_KEY', 'pruebas')
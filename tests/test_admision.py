@@ -0,0 +1,84 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from app.admision import Admision, ColaLlena, UnVuelo
+
+
+def test_rechaza_si_las_llamadas_no_caben_en_la_cola():
+    admision = Admision(max_cola=4)
+    admision.en_cola = 1
+    admision.rechazar_si_saturada(3)
+    with pytest.raises(ColaLlena):
+        admision.rechazar_si_saturada(4)
+    assert admision.rechazadas == 1
+
+
+def test_admitir_cuenta_los_platos_que_no_cubre_el_pool(monkeypatch):
+    from app import main
+
+    monkeypatch.setattr(main, 'gemini_admision', Admision(max_cola=3))
+    monkeypatch.setattr(main.settings, 'GEMINI_BATCH', False)
+    main.gemini_admision.en_cola = 1
+    main._admitir(2)
+    with pytest.raises(HTTPException) as e:
+        main._admitir(3)
+    assert e.value.status_code == 429
+    assert 'Retry-After' in e.value.headers
+    # En modo lote los platos que faltan son una sola llamada
+    monkeypatch.setattr(main.settings, 'GEMINI_BATCH', True)
+    main._admitir(3)
+
+
+def _llamada(llamadas, segundos=0.05, resultado='ok'):
+    async def crear():
+        llamadas.append(1)
+        await asyncio.sleep(segundos)
+        return resultado
+    return crear
+
+
+def test_un_vuelo_comparte_la_llamada_aunque_se_cancele_quien_la_lanzo():
+    async def prueba():
+        un_vuelo, llamadas = UnVuelo(), []
+        primera = asyncio.create_task(un_vuelo.ejecutar('k', _llamada(llamadas)))
+        await asyncio.sleep(0)
+        segunda = asyncio.create_task(un_vuelo.ejecutar('k', _llamada(llamadas)))
+        await asyncio.sleep(0)
+        primera.cancel()
+        assert await segunda == 'ok'
+        assert len(llamadas) == 1 and un_vuelo.fusionadas == 1
+
+    asyncio.run(prueba())
+
+
+def test_un_vuelo_cancela_la_llamada_sin_interesados():
+    async def prueba():
+        un_vuelo, llamadas = UnVuelo(), []
+        tareas = [asyncio.create_task(un_vuelo.ejecutar('k', _llamada(llamadas, 10))) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        compartida = un_vuelo._en_curso['k'][0]
+        for t in tareas:
+            t.cancel()
+        await asyncio.gather(*tareas, return_exceptions=True)
+        await asyncio.sleep(0)
+        assert compartida.cancelled()
+        assert 'k' not in un_vuelo._en_curso
+
+    asyncio.run(prueba())
+
+
+def test_un_vuelo_no_hereda_un_presupuesto_menor():
+    async def prueba():
+        un_vuelo, llamadas = UnVuelo(), []
+        ahora = time.monotonic()
+        corta = un_vuelo.ejecutar('k', _llamada(llamadas, resultado='corta'), ahora + 0.2)
+        larga = un_vuelo.ejecutar('k', _llamada(llamadas, resultado='larga'), ahora + 20)
+        # La de presupuesto largo no se une a la corta; la siguiente, más corta, sí se une a la larga
+        mas_corta = un_vuelo.ejecutar('k', _llamada(llamadas, resultado='otra'), ahora + 1)
+        assert await asyncio.gather(corta, larga, mas_corta) == ['corta', 'larga', 'larga']
+        assert len(llamadas) == 2
+
+    asyncio.run(prueba())
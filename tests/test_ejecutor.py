@@ -0,0 +1,30 @@
+import asyncio
+
+from app import metricas
+from app.ejecutor import Ejecutor
+
+
+def _tarea_con_etapas(n):
+    with metricas.etapa('porciones'):
+        total = sum(range(n))
+    with metricas.etapa('totales'):
+        pass
+    return total
+
+
+def test_las_etapas_de_un_worker_de_procesos_llegan_a_la_request():
+    ejecutor = Ejecutor('procesos', workers=1)
+    ejecutor.iniciar()
+
+    async def correr():
+        await ejecutor.esperar_arranque()
+        tiempos = metricas.iniciar_request()
+        return await ejecutor.ejecutar(_tarea_con_etapas, 1000), tiempos
+
+    try:
+        resultado, tiempos = asyncio.run(correr())
+    finally:
+        ejecutor.detener()
+    assert resultado == sum(range(1000))
+    assert set(tiempos) == {'porciones', 'totales'}
+    assert 'menus_etapa_segundos_count{etapa="porciones"}' in metricas.exportar()
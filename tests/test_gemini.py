@@ -0,0 +1,62 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app import gemini
+from app.admision import Admision
+from app.circuito import Circuito
+from app.settings import settings
+
+
+def _cliente(generar):
+    return lambda: SimpleNamespace(aio=SimpleNamespace(models=SimpleNamespace(generate_content=generar)))
+
+
+@pytest.fixture
+def circuito(monkeypatch):
+    # Circuito que se abre al primer fallo y admisión sin límites, propios de cada prueba
+    circuito = Circuito('prueba', umbral_fallos=1, enfriamiento_s=60)
+    monkeypatch.setattr(gemini, 'circuito', circuito)
+    monkeypatch.setattr(gemini, 'admision', Admision())
+    monkeypatch.setattr(settings, 'GEMINI_TIMEOUT_S', 0.2)
+    return circuito
+
+
+async def _lenta(model, contents):
+    await asyncio.sleep(5)
+
+
+def test_timeout_completo_cuenta_como_fallo(circuito, monkeypatch):
+    monkeypatch.setattr(gemini, 'cliente', _cliente(_lenta))
+    assert asyncio.run(gemini._llamar('prompt', lambda r: r)) is None
+    assert circuito.abierto
+
+
+@pytest.mark.parametrize('respaldo', [False, True])
+def test_timeout_recortado_por_presupuesto_no_cuenta(circuito, monkeypatch, respaldo):
+    monkeypatch.setattr(gemini, 'cliente', _cliente(_lenta))
+    limite = time.monotonic() + 0.05
+    assert asyncio.run(gemini._llamar('prompt', lambda r: r, limite, respaldo=respaldo)) is None
+    assert not circuito.abierto
+
+
+def test_error_de_transporte_cuenta_como_fallo(circuito, monkeypatch):
+    async def caida(model, contents):
+        raise ConnectionError("sin red")
+
+    monkeypatch.setattr(gemini, 'cliente', _cliente(caida))
+    # También con presupuesto: el error no es un recorte del deadline
+    assert asyncio.run(gemini._llamar('prompt', lambda r: r, time.monotonic() + 10)) is None
+    assert circuito.abierto
+
+
+def test_respuesta_valida_cierra_el_circuito(circuito, monkeypatch):
+    async def ok(model, contents):
+        return 'respuesta'
+
+    monkeypatch.setattr(gemini, 'cliente', _cliente(ok))
+    circuito.fallo()
+    assert asyncio.run(gemini._llamar('prompt', str.upper)) == 'RESPUESTA'
+    assert not circuito.abierto
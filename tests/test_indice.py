@@ -0,0 +1,77 @@
+from difflib import SequenceMatcher
+
+import numpy as np
+import pytest
+
+from app import indice as modulo
+from app.indice import IndiceNombres, IngredienteNoEncontrado, TablaHash, hash_texto, plegar_nombre
+
+NOMBRES = ['Arroz blanco', 'Pollo, pechuga', 'Papa amarilla', 'Cebolla roja', 'Ñame cocido', 'Limón']
+
+
+@pytest.fixture(scope='module')
+def idx():
+    return IndiceNombres(NOMBRES)
+
+
+def test_plegar_quita_tildes_mayusculas_y_puntuacion():
+    assert plegar_nombre('  LIMÓN, Sutil ') == 'limon sutil'
+    assert plegar_nombre('Ñame') == plegar_nombre('name') == 'name'
+
+
+@pytest.mark.parametrize('consulta, esperado', [
+    ('Arroz blanco', 0),
+    ('  ARROZ BLANCO ', 0),
+    ('pollo, PECHUGA', 1),
+    ('limon', 5),
+    ('LIMÓN', 5),
+    ('Cebollá Roja', 3),
+    ('ñame cocido', 4),
+])
+def test_tildes_y_mayusculas_no_impiden_resolver(idx, consulta, esperado):
+    assert idx.posicion(consulta) == esperado
+
+
+def test_colision_de_hash_se_confirma_con_el_texto():
+    # Dos claves distintas con el mismo hash: gana la que coincide en texto, no la primera
+    h = hash_texto('b')
+    tabla = TablaHash(np.array([h, h], dtype=np.uint64), np.array([0, 1], dtype=np.int32))
+    assert tabla.buscar('b', ['a', 'b']) == 1
+    assert tabla.buscar('b', ['a', 'c']) is None
+
+
+def test_indice_correcto_aunque_todos_los_hashes_colisionen(monkeypatch):
+    monkeypatch.setattr(modulo, 'hash_texto', lambda texto: 7)
+    idx = IndiceNombres(NOMBRES)
+    assert [idx.posicion(n) for n in NOMBRES] == list(range(len(NOMBRES)))
+    assert idx.posicion('papa AMARILLA') == 2
+    assert 'Papa morada' not in idx
+
+
+@pytest.mark.parametrize('consulta, resuelve', [('arroz bla', True), ('arroz bl', False)])
+def test_umbral_difuso(idx, consulta, resuelve):
+    ratio = SequenceMatcher(None, consulta, 'arroz blanco').ratio()
+    assert (ratio >= 0.85) == resuelve
+    assert idx.umbral_difuso == 0.85
+    if resuelve:
+        assert idx.posicion(consulta) == 0
+    else:
+        with pytest.raises(IngredienteNoEncontrado):
+            idx.posicion(consulta)
+        assert idx.resolver(consulta) is None
+
+
+def test_nombre_ausente_lanza_ingrediente_no_encontrado(idx):
+    with pytest.raises(IngredienteNoEncontrado) as e:
+        idx.posicion('Dragón de Komodo')
+    assert e.value.nombre == 'Dragón de Komodo'
+    assert isinstance(e.value, LookupError)
+    assert idx.resolver('Dragón de Komodo') is None
+    assert 'Dragón de Komodo' not in idx
+
+
+def test_sin_umbral_difuso_solo_resuelve_exacto():
+    idx = IndiceNombres(NOMBRES, umbral_difuso=None)
+    assert idx.posicion('arroz BLANCO') == 0
+    with pytest.raises(IngredienteNoEncontrado):
+        idx.posicion('arroz blanc')
@@ -0,0 +1,51 @@
+import time
+
+from fastapi.testclient import TestClient
+
+from app import main
+
+
+def test_fallo_de_carga_se_informa_en_ready_y_endpoints(monkeypatch):
+    monkeypatch.setattr(main.settings, 'INGREDIENTES_CSV', '/no/existe.csv')
+    monkeypatch.setattr(main, 'listo', False)
+    monkeypatch.setattr(main, 'error_arranque', None)
+    with TestClient(main.app) as c:
+        for _ in range(100):
+            if main.error_arranque:
+                break
+            time.sleep(0.05)
+        r = c.get('/ready')
+        assert r.status_code == 503
+        assert 'no/existe.csv' in r.json()['detail'] and 'Retry-After' not in r.headers
+        r = c.post('/menus/balanced', json={'n_platos': 1})
+        assert r.status_code == 503 and r.json()['detail'] == main.error_arranque
+
+
+def test_sin_reajuste_de_clusters_con_memoria_compartida(monkeypatch, capsys):
+    monkeypatch.setattr(main.settings, 'INGREDIENTES_CSV', '/no/existe.csv')
+    monkeypatch.setattr(main.settings, 'MEMORIA_COMPARTIDA_DIR', '/dev/shm/pruebas')
+    monkeypatch.setattr(main.settings, 'CLUSTERS_REAJUSTE_S', 0.01)
+    monkeypatch.setattr(main, 'listo', False)
+    monkeypatch.setattr(main, 'error_arranque', None)
+    llamadas = []
+    monkeypatch.setattr(main, '_reajustar_clusters', lambda: llamadas.append(1))
+    with TestClient(main.app):
+        pass
+    assert not llamadas
+    assert 'CLUSTERS_REAJUSTE_S se ignora' in capsys.readouterr().out
+
+
+def test_stream_responde_503_si_el_snapshot_no_cabe_en_el_ejecutor(monkeypatch):
+    from app.ejecutor import EjecutorSaturado
+
+    async def saturado(*args, **kwargs):
+        raise EjecutorSaturado(2)
+
+    monkeypatch.setattr(main, 'listo', True)
+    monkeypatch.setattr(main, 'error_arranque', None)
+    monkeypatch.setattr(main.settings, 'AFINIDAD', 'cluster')
+    monkeypatch.setattr(main, '_admitir', lambda n: None)
+    monkeypatch.setattr(main.ejecutor, 'ejecutar', saturado)
+    # Sin lifespan: ni carga de datos ni pool de platos
+    r = TestClient(main.app).post('/menus/balanced/stream', json={'n_platos': 2})
+    assert r.status_code == 503 and r.headers['Retry-After'] == '2'
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from app.indice import IndiceNombres
+from app.nutricion import MotorNutricional
+
+NOMBRES = ['Arroz blanco', 'Pollo, pechuga', 'Papa amarilla', 'Cebolla roja', 'Aceite de oliva']
+
+
+def _sel(*pares):
+    return [{'name': n, 'grams': g} for n, g in pares]
+
+
+SELECCIONES = [
+    _sel(('Arroz blanco', 150), ('Pollo, pechuga', 120)),
+    [],
+    _sel(('Papa amarilla', 200)),
+    _sel(('Cebolla roja', 30), ('Aceite de oliva', 10), ('Arroz blanco', 80), ('Cebolla roja', 15)),
+    [],
+    [],
+    _sel(('Aceite de oliva', '12.5')),
+]
+
+
+@pytest.fixture(scope='module', params=[np.float64, np.float32])
+def motor(request):
+    matriz = np.random.default_rng(0).uniform(0, 100, (len(NOMBRES), 6)).astype(request.param)
+    return MotorNutricional(matriz, [f'n{j}' for j in range(6)], IndiceNombres(NOMBRES))
+
+
+def _fila_a_fila(motor, selecciones):
+    return np.array([motor.totales(sel) if sel else np.zeros(len(motor.columnas)) for sel in selecciones])
+
+
+@pytest.mark.parametrize('selecciones', [
+    SELECCIONES,
+    [],
+    [[], []],
+    SELECCIONES[:1],
+    [[]] + SELECCIONES[2:4],
+    SELECCIONES[2:4] + [[]],
+], ids=['mixto', 'ninguna', 'solo-vacias', 'una', 'vacia-al-inicio', 'vacia-al-final'])
+def test_totales_lote_coincide_con_totales(motor, selecciones):
+    lote = motor.totales_lote(selecciones)
+    assert lote.shape == (len(selecciones), len(motor.columnas))
+    np.testing.assert_allclose(lote, _fila_a_fila(motor, selecciones).reshape(lote.shape), rtol=1e-6)
+
+
+def test_totales_lote_con_posiciones_ya_resueltas(motor):
+    posiciones = [[motor.indice.posicion(s['name']) for s in sel] for sel in SELECCIONES]
+    np.testing.assert_allclose(
+        motor.totales_lote(SELECCIONES, posiciones), motor.totales_lote(SELECCIONES), rtol=1e-12,
+    )
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from app.indice import IndiceNombres
+from app.nutricion import MACROS, MotorNutricional
+from app.optimizador import optimizar_porciones
+
+OBJETIVOS = {'Carbohidratos': (45, 65), 'Proteínas': (10, 35), 'Grasas': (20, 35)}
+
+# Por 100 g: carbohidratos, proteínas, grasas (la energía se deriva con 4/4/9 kcal por gramo)
+INGREDIENTES = {
+    'arroz': (28.0, 2.7, 0.3),
+    'pollo': (0.0, 27.0, 3.6),
+    'aceite': (0.0, 0.0, 100.0),
+    'papa': (17.0, 2.0, 0.1),
+    'palta': (8.5, 2.0, 14.7),
+    'manteca': (0.0, 0.0, 99.0),
+    'tocino': (0.0, 3.0, 70.0),
+}
+
+
+@pytest.fixture(scope='module')
+def motor():
+    nombres = list(INGREDIENTES)
+    C, P, G = np.array(list(INGREDIENTES.values())).T
+    matriz = np.column_stack([4 * C + 4 * P + 9 * G, C, P, G])
+    return MotorNutricional(matriz, list(MACROS.values()), IndiceNombres(nombres))
+
+
+def _posiciones(*nombres):
+    return [list(INGREDIENTES).index(n) for n in nombres]
+
+
+@pytest.mark.parametrize('nombres', [('arroz', 'pollo', 'aceite'), ('arroz', 'pollo', 'papa', 'palta')])
+def test_reparto_factible_cumple_objetivos_y_energia(motor, nombres):
+    res = optimizar_porciones(motor, _posiciones(*nombres), OBJETIVOS, energia_kcal=600, min_g=10, max_g=300)
+    assert res['cumple']
+    assert all(10 <= g <= 300 for g in res['weights_g'])
+    energia = sum(motor.matriz[p, 0] * g / 100 for p, g in zip(_posiciones(*nombres), res['weights_g']))
+    assert energia == pytest.approx(600, abs=10)
+
+
+@pytest.mark.parametrize('nombres', [('arroz', 'pollo', 'papa', 'palta'), ('arroz', 'pollo', 'aceite', 'papa', 'palta')])
+def test_objetivo_secundario_evita_repartos_en_los_extremos(motor, nombres):
+    # Sólo con la energía el LP devuelve un vértice con ingredientes en min_g y max_g
+    res = optimizar_porciones(motor, _posiciones(*nombres), OBJETIVOS, min_g=10, max_g=300)
+    assert res['cumple']
+    assert all(10 < g < 300 for g in res['weights_g'])
+
+
+def test_sin_solucion_factible_devuelve_reparto_acotado(motor):
+    # Sólo grasas: ningún reparto llega al mínimo de carbohidratos
+    res = optimizar_porciones(motor, _posiciones('aceite', 'manteca', 'tocino'), OBJETIVOS, min_g=10, max_g=300)
+    assert not res['cumple']
+    assert all(10 <= g <= 300 for g in res['weights_g'])
@@ -0,0 +1,85 @@
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app import gemini, procesamiento
+from app.cache_respuestas import CacheRespuestas
+from app.indice import IndiceNombres
+
+INDICE = IndiceNombres(['Arroz blanco', 'Pollo, pechuga', 'Papa amarilla', 'Cebolla roja'])
+PROTOS = [{'name': 'Arroz blanco'}, {'name': 'Pollo, pechuga'}, {'name': 'Papa amarilla'}]
+
+
+def _respuesta(datos):
+    texto = json.dumps(datos)
+    return SimpleNamespace(candidates=[SimpleNamespace(content=SimpleNamespace(text=texto))])
+
+
+@pytest.fixture
+def gemini_falso(monkeypatch):
+    # Cada llamada devuelve la siguiente respuesta de la lista (la última se repite)
+    respuestas, llamadas = [], []
+
+    async def generar_async(prompt, parsear, limite=None, clave=None):
+        llamadas.append(prompt)
+        return parsear(_respuesta(respuestas[min(len(llamadas), len(respuestas)) - 1]))
+
+    monkeypatch.setattr(gemini, 'generar_async', generar_async)
+    monkeypatch.setattr(gemini, 'espera_reintento', lambda intento: 0)
+    monkeypatch.setattr(procesamiento, 'cache_respuestas', CacheRespuestas(10, 60))
+    return respuestas, llamadas
+
+
+def _plato(*ingredientes):
+    return {'dish_name': 'Plato', 'ingredients': list(ingredientes), 'weights_g': [100] * len(ingredientes)}
+
+
+def test_ingrediente_inventado_se_reintenta_y_no_se_cachea(gemini_falso):
+    respuestas, llamadas = gemini_falso
+    respuestas.append(_plato('Arroz blanco', 'Pollo, pechuga', 'Unicornio asado'))
+    for _ in range(3):
+        data = asyncio.run(procesamiento.ask_gemini_to_select_async(PROTOS, max_retries=2, indice=INDICE))
+        assert data == {}
+    assert len(llamadas) == 6
+    assert procesamiento.cache_respuestas.estadisticas()['entradas'] == 0
+
+
+def test_respuesta_con_nombres_de_la_bd_se_cachea(gemini_falso):
+    respuestas, llamadas = gemini_falso
+    respuestas += [
+        _plato('Arroz blanco', 'Unicornio asado', 'Papa amarilla'),
+        # Variantes que el índice resuelve (mayúsculas, puntuación): válidas
+        _plato('arroz blanco', 'Pollo pechuga', 'Papa amarilla'),
+    ]
+    for _ in range(2):
+        data = asyncio.run(procesamiento.ask_gemini_to_select_async(PROTOS, max_retries=3, indice=INDICE))
+        assert data['ingredients'][0] == 'arroz blanco'
+    assert len(llamadas) == 2
+
+
+def test_lote_descarta_solo_el_plato_con_ingredientes_inventados(gemini_falso):
+    respuestas, llamadas = gemini_falso
+    respuestas.append({'dishes': [
+        {'index': 0, **_plato('Arroz blanco', 'Pollo, pechuga', 'Papa amarilla')},
+        {'index': 1, **_plato('Arroz blanco', 'Pollo, pechuga', 'Unicornio asado')},
+    ]})
+    lote = procesamiento.ask_gemini_to_select_batch_async([PROTOS, PROTOS[::-1]], max_retries=2, indice=INDICE)
+    datos = asyncio.run(lote)
+    assert datos[0] and not datos[1]
+    assert len(llamadas) == 2
+    assert procesamiento.cache_respuestas.estadisticas()['entradas'] == 1
+
+
+def test_sin_espera_tras_el_ultimo_intento(gemini_falso, monkeypatch):
+    respuestas, llamadas = gemini_falso
+    respuestas.append({})
+    monkeypatch.setattr(gemini, 'espera_reintento', lambda intento: 3.0)
+    inicio = time.perf_counter()
+    assert asyncio.run(procesamiento.ask_gemini_to_select_async(PROTOS, max_retries=1, indice=INDICE)) == {}
+    lote = procesamiento.ask_gemini_to_select_batch_async([PROTOS], max_retries=1, indice=INDICE)
+    assert asyncio.run(lote) == [{}]
+    assert time.perf_counter() - inicio < 1
+    assert len(llamadas) == 2